@@ -19,12 +19,13 @@ django.setup()
 # Now import after Django is fully set up
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
-from channels.auth import AuthMiddlewareStack
+from apps.chat.middleware import JWTAuthMiddleware
 import apps.chat.routing
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    # Socket chat chỉ dùng JWT: không cần session / cookie của AuthMiddlewareStack
+    "websocket": JWTAuthMiddleware(
         URLRouter(
             apps.chat.routing.websocket_urlpatterns
         )
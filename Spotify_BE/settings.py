@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'rest_framework_simplejwt.token_blacklist',
@@ -114,6 +115,9 @@ CACHES = {
     }
 }
 
+# Token bucket của apps.utils.throttling (bỏ trống -> chỉ dùng bucket trong process)
+REDIS_URL = config('RD_URL')
+
 # Auth
 AUTH_USER_MODEL = 'users.User'
 
@@ -183,13 +187,26 @@ USE_TZ = True
 # REST Framework & JWT
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        # JWT trước: phần lớn request dùng Bearer token, user lấy từ cache
+        'apps.users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Số reverse proxy phía trước app (Render: 1). 0 -> dùng REMOTE_ADDR, bỏ qua
+    # X-Forwarded-For do client tự gửi khi xác định IP cho throttle
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+    # '<throttle_scope>_<ip|user|username>', xem apps.utils.throttling
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '10/min',
+        'login_username': '5/min',
+        'social_login_ip': '10/min',
+        'availability_ip': '30/min',
+        'play_ip': '120/min',
+        'play_user': '60/min',
+    },
 }
 
 SIMPLE_JWT = {
@@ -197,6 +214,10 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'BLACKLIST_AFTER_ROTATION': True,
     'SIGNING_KEY': SECRET_KEY_JWT,
+    # Kiểm tra blacklist qua tập JTI trên Redis (apps.users.tokens), chạy prune_tokens định kỳ
+    'TOKEN_REFRESH_SERIALIZER': 'apps.users.serializers.CachedTokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'apps.users.serializers.CachedTokenVerifySerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'apps.users.serializers.CachedTokenBlacklistSerializer',
 }
 
 # Auth backends
@@ -26,10 +26,12 @@ from apps.users.views import create_user, get_user, get_users, update_user, dele
 from apps.playlists.views import createPlaylist, updatePlaylist, deletePlaylist, getPlaylist, getPlaylists, searchPlaylists
 from apps.users.views import create_user, get_user, get_users, update_user, delete_user
 from apps.playlists.views import createPlaylist, updatePlaylist, deletePlaylist, getPlaylist, getPlaylists, searchPlaylists, getUserPlaylists, searchAllPlaylists
+from apps.playlists.views import duplicatePlaylist, mergePlaylist
 from apps.song_playlist.views import (
     add_song_to_playlist, go_to_artist, view_credits, getSongsFromPlaylist,
     deleteSongFrom_Playlist, searchSongsFromPlaylist, add_to_liked_songs_view,
     get_liked_songs_view, remove_from_liked_songs_view, search_liked_songs_view,
+    bulk_add_songs_to_playlist, bulk_delete_songs_from_playlist, move_song_in_playlist,
  )
 
 urlpatterns = [
@@ -60,6 +62,8 @@ urlpatterns = [
     path('playlists/create/', createPlaylist, name='create_playlist'),
     path('playlists/<uuid:id>/update/', updatePlaylist, name='update_playlist'),
     path('playlists/<uuid:id>/delete/', deletePlaylist, name='delete_playlist'),
+    path('playlists/<uuid:id>/duplicate/', duplicatePlaylist, name='duplicate_playlist'),
+    path('playlists/<uuid:id>/merge/', mergePlaylist, name='merge_playlist'),
     path('playlists/<uuid:id>/', getPlaylist, name='get_playlist'),
     path('playlists/<uuid:id>/user', getUserPlaylists, name='get_user_playlist'),
     path('playlists/search/', searchPlaylists, name='search_playlists'),
@@ -68,7 +72,10 @@ urlpatterns = [
     # SongPlaylist URLs
     path('song_playlist/create/', add_song_to_playlist, name='create_song_playlist'),
     path('song_playlist/<uuid:playlist_id>/songs/', getSongsFromPlaylist, name='get_songs_from_playlist'),
+    path('song_playlist/<uuid:playlist_id>/songs/bulk/', bulk_add_songs_to_playlist, name='bulk_add_songs_to_playlist'),
+    path('song_playlist/<uuid:playlist_id>/songs/bulk/delete/', bulk_delete_songs_from_playlist, name='bulk_delete_songs_from_playlist'),
     path('song_playlist/<uuid:playlist_id>/songs/search/', searchSongsFromPlaylist, name='search_songs_from_playlist'),
+    path('song_playlist/<uuid:playlist_id>/songs/<uuid:song_id>/move/', move_song_in_playlist, name='move_song_in_playlist'),
     path('song_playlist/<uuid:playlist_id>/songs/<uuid:song_id>/delete/', deleteSongFrom_Playlist, name='delete_song_from_playlist'),
     path('song_playlist/<uuid:id>/delete/', go_to_artist, name='delete_song_playlist'),
     path('song_playlist/<uuid:id>/', view_credits, name='get_song_playlist'),
@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Chat
+from .models import Chat, Conversation
 # Register your models here.
-admin.site.register(Chat)
\ No newline at end of file
+admin.site.register(Chat)
+admin.site.register(Conversation)
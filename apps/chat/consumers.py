@@ -1,73 +1,72 @@
+import asyncio
 import json
-import urllib.parse
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import Chat
-from apps.users.models import User
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework.exceptions import AuthenticationFailed
+from .models import Chat, conversation_key, conversation_members
+from .services import mark_read, read_receipt_event, send_to_conversation, user_group_name
+from .writer import get_message_writer
+from apps.users.authentication import aget_cached_user
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        # Extract token from query string
-        query_string = self.scope['query_string'].decode('utf-8')
-        query_params = dict(urllib.parse.parse_qsl(query_string))
-        token = query_params.get('token')
-
-        if not token:
-            # If no token in query params, check headers
-            headers = dict(self.scope['headers'])
-            auth_header = headers.get(b'authorization', b'').decode('utf-8')
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-
-        if not token:
-            # No authentication provided, reject the connection
-            await self.close(code=4001)
-            return
+MAX_MESSAGE_LENGTH = Chat._meta.get_field('message').max_length
 
-        # Authenticate the user
-        try:
-            # Use synchronous JWT authentication in an async context
-            validated_token = await database_sync_to_async(self.get_validated_token)(token)
-            self.user = await database_sync_to_async(self.get_user)(validated_token)
 
-            # Get other user information
-            self.other_user_id = self.scope['url_route']['kwargs']['other_user_id']
-            self.other_user = await database_sync_to_async(User.objects.get)(id=self.other_user_id)
+def validate_message(message):
+    """
+    Kiểm tra trước khi broadcast / đưa vào MessageWriter: một tin lỗi không được làm hỏng
+    cả lô của writer.
 
-            # Create a chat room name based on user IDs (ordered to ensure consistency)
-            self.room_group_name = f'chat_{min(str(self.user.id), str(self.other_user.id))}_{max(str(self.user.id), str(self.other_user.id))}'
+    Returns:
+        str: lý do không hợp lệ, None nếu hợp lệ
+    """
+    if not isinstance(message, str) or not message.strip():
+        return 'Message must be a non-empty string'
+    if '\x00' in message:
+        return 'Message must not contain null characters'
+    if len(message) > MAX_MESSAGE_LENGTH:
+        return f'Message must be at most {MAX_MESSAGE_LENGTH} characters'
+    return None
 
-            # Add this connection to the group
-            await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
-            # Accept the connection
-            await self.accept()
+class BaseChatConsumer(AsyncWebsocketConsumer):
+    """
+    Xác thực, gửi tin nhắn / đánh dấu đã đọc dùng chung cho hai kiểu socket chat.
 
-            # Send authentication success message
-            await self.send(text_data=json.dumps({
-                'type': 'authentication_success'
-            }))
+    Cả hai kiểu socket đều nghe group user_<id> của user (send_to_conversation chỉ gửi
+    tới group của hai người tham gia).
+    """
 
-        except (AuthenticationFailed, User.DoesNotExist) as e:
-            # Authentication failed or user not found
-            error_message = "Authentication failed" if isinstance(e, AuthenticationFailed) else "User not found"
-            await self.close(code=4003)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending_acks = set()
+        # key -> id người còn lại, đã kiểm tra tồn tại trong phiên kết nối này
+        self.conversations = {}
 
-    def get_validated_token(self, token):
-        # Synchronous method to validate the token
-        return JWTAuthentication().get_validated_token(token)
+    async def authenticate(self):
+        """
+        User đã được JWTAuthMiddleware xác thực (Spotify_BE/asgi.py).
 
-    def get_user(self, validated_token):
-        # Synchronous method to get the user from token
-        return JWTAuthentication().get_user(validated_token)
+        Returns:
+            User hoặc None (khi đó connection đã bị đóng)
+        """
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            # 4001: không có token, 4003: token / user không hợp lệ
+            await self.close(code=4001 if self.scope.get('auth_error') == 'missing' else 4003)
+            return None
+        return user
+
+    async def join_user_group(self):
+        self.group_name = user_group_name(self.user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send(text_data=json.dumps({
+            'type': 'authentication_success'
+        }))
 
     async def disconnect(self, close_code):
-        # Remove from group on disconnect
-        if hasattr(self, 'room_group_name'):
-            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def receive(self, text_data):
         try:
@@ -80,27 +79,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 }))
                 return
 
-            # Handle regular chat messages
-            if 'message' in text_data_json:
-                message = text_data_json['message']
-
-                # Save message to database
-                await database_sync_to_async(Chat.objects.create)(
-                    user1=self.user,
-                    user2=self.other_user,
-                    message=message
-                )
-
-                # Send message to room group
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'chat_message',
-                        'message': message,
-                        'sender': str(self.user.id),
-                        'recipient': str(self.other_user.id)
-                    }
-                )
+            await self.handle(text_data_json)
         except json.JSONDecodeError:
             # Handle invalid JSON
             await self.send(text_data=json.dumps({
@@ -114,14 +93,195 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'message': f'Error processing message: {str(e)}'
             }))
 
+    def get_conversation_key(self, data):
+        return data.get('conversation_key')
+
+    async def get_other_user_id(self, key):
+        """
+        Returns:
+            str: id người còn lại trong cuộc trò chuyện, None nếu key không hợp lệ
+        """
+        if key in self.conversations:
+            return self.conversations[key]
+        try:
+            members = conversation_members(key)
+        except ValueError:
+            return None
+        user_id = str(self.user.id)
+        if user_id not in members:
+            return None
+        other_user_id = members[1] if members[0] == user_id else members[0]
+        if await aget_cached_user(other_user_id) is None:
+            return None
+        self.conversations[key] = other_user_id
+        return other_user_id
+
+    async def handle(self, data):
+        key = self.get_conversation_key(data)
+        other_user_id = await self.get_other_user_id(key)
+        if other_user_id is None:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'conversation_key': key,
+                'message': 'Invalid conversation'
+            }))
+            return
+
+        if data.get('type') == 'mark_read':
+            await self.handle_mark_read(key, other_user_id, data.get('up_to'))
+            return
+
+        if 'message' in data:
+            await self.send_chat_message(key, other_user_id, data['message'], data.get('client_id'))
+
+    async def send_chat_message(self, key, other_user_id, message, client_id=None):
+        error = validate_message(message)
+        if error:
+            await self.send(text_data=json.dumps({
+                'type': 'message_error',
+                'conversation_key': key,
+                'client_id': client_id,
+                'message': error
+            }))
+            return
+
+        chat = Chat(user1=self.user, user2_id=other_user_id, conversation_key=key, message=message)
+
+        # Gửi ngay tới group của cả hai user, việc lưu DB được gom lô bởi MessageWriter
+        await send_to_conversation(key, {
+            'type': 'chat_message',
+            'conversation_key': key,
+            'id': str(chat.id),
+            'message': message,
+            'sender': str(self.user.id),
+            'recipient': str(other_user_id)
+        }, self.channel_layer)
+
+        # submit() chờ khi hàng đợi đầy (backpressure); ack gửi sau khi đã commit
+        saved = await get_message_writer().submit(chat)
+        task = asyncio.ensure_future(self.send_ack(saved, chat, client_id))
+        # Giữ tham chiếu tới task cho tới khi xong (event loop chỉ giữ weak reference)
+        self.pending_acks.add(task)
+        task.add_done_callback(self.pending_acks.discard)
+
+    async def send_ack(self, saved, chat, client_id=None):
+        try:
+            await saved
+        except Exception:
+            await self.send(text_data=json.dumps({
+                'type': 'message_error',
+                'conversation_key': chat.conversation_key,
+                'id': str(chat.id),
+                'client_id': client_id,
+                'message': 'Message could not be saved'
+            }))
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'message_ack',
+            'conversation_key': chat.conversation_key,
+            'id': str(chat.id),
+            'client_id': client_id,
+            'created_at': chat.created_at.isoformat()
+        }))
+
+    async def handle_mark_read(self, key, other_user_id, up_to=None):
+        # Đánh dấu đã đọc tới tin nhắn up_to, người gửi nhận read_receipt qua channel layer
+        try:
+            marked, unread = await database_sync_to_async(mark_read)(self.user, other_user_id, up_to)
+        except ValueError as e:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': str(e)
+            }))
+            return
+        if marked:
+            await send_to_conversation(
+                key, read_receipt_event(key, self.user.id, up_to, marked), self.channel_layer
+            )
+        await self.send(text_data=json.dumps({
+            'type': 'read_ack',
+            'conversation_key': key,
+            'up_to': up_to,
+            'marked': marked,
+            'unread_count': unread
+        }))
+
+    async def read_receipt(self, event):
+        await self.send(text_data=json.dumps(event))
+
+
+class ChatConsumer(BaseChatConsumer):
+    """
+    Socket cũ ws/chat/<other_user_id>/: một socket cho mỗi cuộc trò chuyện.
+
+    Chỉ giữ cho client chưa chuyển sang ws/chat/ (xoá cùng route trong routing.py khi
+    không còn client cũ). Không còn room chat_<key> riêng: socket nghe group của user
+    và bỏ qua event của cuộc trò chuyện khác, nên mỗi tin nhắn chỉ tốn group_send
+    tới group của hai người tham gia.
+    """
+
+    async def connect(self):
+        # Authenticate the user
+        self.user = await self.authenticate()
+        if self.user is None:
+            return
+
+        # Get other user information (qua cache user dùng chung, không query DB mỗi lần connect)
+        self.other_user_id = self.scope['url_route']['kwargs']['other_user_id']
+        self.other_user = await aget_cached_user(self.other_user_id)
+        if self.other_user is None:
+            # User not found
+            await self.close(code=4003)
+            return
+
+        self.conversation_key = conversation_key(self.user.id, self.other_user.id)
+        self.conversations[self.conversation_key] = str(self.other_user.id)
+        await self.join_user_group()
+
+    def get_conversation_key(self, data):
+        return self.conversation_key
+
     async def chat_message(self, event):
+        if event['conversation_key'] != self.conversation_key:
+            return
         # Send message to WebSocket
         message = event['message']
         sender = event['sender']
         recipient = event['recipient']
 
         await self.send(text_data=json.dumps({
+            'id': event.get('id'),
             'message': message,
             'sender': sender,
             'recipient': recipient
-        }))
\ No newline at end of file
+        }))
+
+    async def read_receipt(self, event):
+        if event['conversation_key'] == self.conversation_key:
+            await super().read_receipt(event)
+
+
+class UserChatConsumer(BaseChatConsumer):
+    """
+    Socket ws/chat/: một socket cho mọi cuộc trò chuyện của user (group user_<id>).
+
+    Client gửi / nhận payload có 'conversation_key' (conversation_key() của hai user):
+        {"conversation_key": ..., "message": ..., "client_id": ...}
+        {"type": "mark_read", "conversation_key": ..., "up_to": <id tin nhắn>}
+    """
+
+    async def connect(self):
+        self.user = await self.authenticate()
+        if self.user is None:
+            return
+        await self.join_user_group()
+
+    async def chat_message(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'message',
+            'conversation_key': event['conversation_key'],
+            'id': event.get('id'),
+            'message': event['message'],
+            'sender': event['sender'],
+            'recipient': event['recipient']
+        }))
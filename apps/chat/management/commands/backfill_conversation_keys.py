@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from apps.chat.models import Chat, conversation_key
+
+class Command(BaseCommand):
+    help = 'Fill Chat.conversation_key for messages stored before the column existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+
+        # Mỗi vòng lấy batch tiếp theo còn thiếu key (batch trước đã được điền nên không bị lặp lại)
+        while True:
+            chats = list(
+                Chat.objects.filter(conversation_key='')
+                .order_by('id').only('id', 'user1_id', 'user2_id')[:batch_size]
+            )
+            if not chats:
+                break
+            for chat in chats:
+                chat.conversation_key = conversation_key(chat.user1_id, chat.user2_id)
+            Chat.objects.bulk_update(chats, ['conversation_key'])
+            updated += len(chats)
+            self.stdout.write(f'Backfilled {updated} messages')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled conversation keys for {updated} messages'))
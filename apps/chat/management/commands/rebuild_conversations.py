@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, OuterRef, Subquery
+from apps.chat.models import Chat, Conversation
+
+class Command(BaseCommand):
+    help = 'Rebuild Conversation summaries (last message, unread counts) from Chat; run after backfill_conversation_keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        keys = list(
+            Chat.objects.exclude(conversation_key='')
+            .order_by('conversation_key').values_list('conversation_key', flat=True).distinct()
+        )
+        latest = Chat.objects.filter(conversation_key=OuterRef('conversation_key')).order_by('-created_at', '-id')
+
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            rows = (
+                Chat.objects.filter(conversation_key__in=batch)
+                .values('conversation_key')
+                .annotate(
+                    last_activity=Max('created_at'),
+                    last_message_id=Subquery(latest.values('id')[:1]),
+                )
+            )
+            # Số tin chưa đọc theo người nhận (user2)
+            unread = {
+                (row['conversation_key'], str(row['user2_id'])): row['count']
+                for row in Chat.objects.filter(conversation_key__in=batch, is_read=False)
+                .values('conversation_key', 'user2_id').annotate(count=Count('id'))
+            }
+
+            conversations = []
+            for row in rows:
+                key = row['conversation_key']
+                user1_id, user2_id = key.split('_')
+                conversations.append(Conversation(
+                    key=key,
+                    user1_id=user1_id,
+                    user2_id=user2_id,
+                    last_message_id=row['last_message_id'],
+                    last_activity=row['last_activity'],
+                    user1_unread=unread.get((key, user1_id), 0),
+                    user2_unread=unread.get((key, user2_id), 0) if user1_id != user2_id else 0,
+                ))
+            Conversation.objects.bulk_create(
+                conversations,
+                update_conflicts=True,
+                unique_fields=['key'],
+                update_fields=['last_message', 'last_activity', 'user1_unread', 'user2_unread'],
+            )
+            self.stdout.write(f'Rebuilt {start + len(batch)}/{len(keys)} conversations')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(keys)} conversations'))
@@ -0,0 +1,42 @@
+import urllib.parse
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from apps.users.authentication import CachedJWTAuthentication
+
+
+def get_token(scope):
+    """Access token từ query string (?token=) hoặc header Authorization: Bearer"""
+    query_params = dict(urllib.parse.parse_qsl(scope.get('query_string', b'').decode('utf-8')))
+    token = query_params.get('token')
+    if not token:
+        headers = dict(scope.get('headers', []))
+        auth_header = headers.get(b'authorization', b'').decode('utf-8')
+        if auth_header.startswith('Bearer '):
+            token = auth_header.split(' ')[1]
+    return token
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Xác thực WebSocket bằng JWT thay cho AuthMiddlewareStack (session + DB).
+
+    Đặt scope['user'] (AnonymousUser nếu không xác thực được) và scope['auth_error']:
+    None, 'missing' (không có token) hoặc 'invalid'.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        scope['user'] = AnonymousUser()
+        scope['auth_error'] = None
+
+        token = get_token(scope)
+        if not token:
+            scope['auth_error'] = 'missing'
+        else:
+            try:
+                scope['user'] = await CachedJWTAuthentication().aauthenticate_token(token)
+            except AuthenticationFailed:
+                scope['auth_error'] = 'invalid'
+
+        return await super().__call__(scope, receive, send)
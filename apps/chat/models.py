@@ -1,11 +1,38 @@
 from django.db import models
+from django.db.models import Q
 from apps.users.models import User
 import uuid
 
+
+def conversation_key(user_a_id, user_b_id):
+    """Khoá chuẩn của một cặp user, không phụ thuộc thứ tự: '<id nhỏ>_<id lớn>'"""
+    first, second = sorted((str(user_a_id), str(user_b_id)))
+    return f'{first}_{second}'
+
+
+def conversation_members(key):
+    """
+    Returns:
+        tuple: (id nhỏ, id lớn) của hai user trong key
+
+    Raises:
+        ValueError: nếu key không đúng dạng conversation_key()
+    """
+    parts = key.split('_') if isinstance(key, str) else []
+    if len(parts) != 2:
+        raise ValueError('Invalid conversation key')
+    members = tuple(str(uuid.UUID(part)) for part in parts)
+    if conversation_key(*members) != key:
+        raise ValueError('Invalid conversation key')
+    return members
+
+
 class Chat(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # user1 là người gửi, user2 là người nhận
     user1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chats_as_user1')
     user2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chats_as_user2')
+    conversation_key = models.CharField(max_length=80, default='', editable=False)
     message = models.TextField(max_length=1000)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -15,6 +42,52 @@ class Chat(models.Model):
     def __str__(self):
         return f'{self.user1.username} - {self.user2.username}'
 
+    def save(self, *args, **kwargs):
+        if not self.conversation_key:
+            self.conversation_key = conversation_key(self.user1_id, self.user2_id)
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Lịch sử một cuộc trò chuyện, phân trang theo cursor (created_at, id)
+            models.Index(fields=['conversation_key', 'created_at', 'id'], name='chat_conversation_idx'),
+            # Chỉ chứa tin chưa đọc: mark_read cập nhật theo (conversation_key, người nhận, created_at)
+            models.Index(
+                fields=['conversation_key', 'user2', 'created_at'],
+                condition=Q(is_read=False),
+                name='chat_unread_idx'
+            ),
+        ]
 
+
+class Conversation(models.Model):
+    """
+    Tóm tắt một cặp user cho inbox: tin nhắn cuối và số tin chưa đọc của từng người.
+    Được cập nhật cùng transaction với việc lưu Chat (xem services.record_messages).
+    """
+    key = models.CharField(max_length=80, unique=True)
+    # user1 có id nhỏ hơn, khớp với thứ tự trong key
+    user1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations_as_user1')
+    user2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations_as_user2')
+    last_message = models.ForeignKey(Chat, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_activity = models.DateTimeField()
+    user1_unread = models.PositiveIntegerField(default=0)
+    user2_unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.key
+
+    def unread_for(self, user_id):
+        return self.user1_unread if str(user_id) == str(self.user1_id) else self.user2_unread
+
+    def other_user(self, user_id):
+        return self.user2 if str(user_id) == str(self.user1_id) else self.user1
+
+    class Meta:
+        ordering = ['-last_activity']
+        indexes = [
+            # Inbox: các cuộc trò chuyện của một user, mới hoạt động nhất trước
+            models.Index(fields=['user1', '-last_activity'], name='chat_conv_user1_activity_idx'),
+            models.Index(fields=['user2', '-last_activity'], name='chat_conv_user2_activity_idx'),
+        ]
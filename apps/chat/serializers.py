@@ -4,5 +4,5 @@ from .models import Chat
 class ChatSerializer(serializers.ModelSerializer):
     class Meta:
         model = Chat
-        fields = ['id', 'message', 'created_at', 'updated_at', 'user1', 'user2']
-        read_only_fields = ['user1', 'user2', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'message', 'created_at', 'updated_at', 'user1', 'user2', 'is_read']
+        read_only_fields = ['user1', 'user2', 'created_at', 'updated_at', 'is_read']
\ No newline at end of file
@@ -0,0 +1,154 @@
+# apps/chat/services.py
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q, Sum
+from channels.layers import get_channel_layer
+from .models import Chat, Conversation, conversation_key, conversation_members
+
+UNREAD_CACHE_TIMEOUT = 5 * 60
+
+
+def user_group_name(user_id):
+    """Group của socket ws/chat/ (UserChatConsumer) của một user"""
+    return f'user_{user_id}'
+
+
+def conversation_groups(key):
+    """Group của từng người tham gia (cả socket ws/chat/ lẫn ws/chat/<id>/ đều nghe group này)"""
+    return [user_group_name(user_id) for user_id in dict.fromkeys(conversation_members(key))]
+
+
+async def send_to_conversation(key, event, channel_layer=None):
+    channel_layer = channel_layer or get_channel_layer()
+    for group in conversation_groups(key):
+        await channel_layer.group_send(group, event)
+
+
+def unread_cache_key(user_id):
+    return f'chat_unread:{user_id}'
+
+
+def invalidate_unread_totals(user_ids):
+    """Xoá bộ đếm chưa đọc trong cache sau khi transaction hiện tại commit"""
+    keys = [unread_cache_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_unread_total(user_id):
+    """Tổng số tin chưa đọc của user trên mọi cuộc trò chuyện (cache, fallback cộng từ Conversation)"""
+    key = unread_cache_key(user_id)
+    total = cache.get(key)
+    if total is None:
+        total = (
+            (Conversation.objects.filter(user1_id=user_id).aggregate(n=Sum('user1_unread'))['n'] or 0) +
+            (Conversation.objects.filter(user2_id=user_id).aggregate(n=Sum('user2_unread'))['n'] or 0)
+        )
+        cache.set(key, total, timeout=UNREAD_CACHE_TIMEOUT)
+    return total
+
+
+def record_messages(chats):
+    """
+    Cập nhật Conversation (tin nhắn cuối, thời điểm hoạt động, số tin chưa đọc) cho một lô
+    Chat vừa lưu. Phải gọi trong cùng transaction với việc insert Chat.
+
+    Tốn cố định 3 query cho cả lô: tạo các cuộc trò chuyện còn thiếu, khoá các dòng,
+    bulk_update.
+    """
+    by_key = {}
+    for chat in chats:
+        by_key.setdefault(chat.conversation_key, []).append(chat)
+    if not by_key:
+        return
+
+    # Tạo trước các dòng còn thiếu; ignore_conflicts để hai worker cùng tạo không lỗi.
+    # Chèn theo thứ tự key (giống thứ tự khoá bên dưới) để INSERT song song không deadlock
+    Conversation.objects.bulk_create([
+        Conversation(
+            key=key,
+            user1_id=min(by_key[key][0].user1_id, by_key[key][0].user2_id, key=str),
+            user2_id=max(by_key[key][0].user1_id, by_key[key][0].user2_id, key=str),
+            last_activity=by_key[key][0].created_at,
+        )
+        for key in sorted(by_key)
+    ], ignore_conflicts=True)
+
+    # Khoá theo thứ tự key để các transaction song song không deadlock
+    conversations = list(
+        Conversation.objects.select_for_update().filter(key__in=by_key).order_by('key')
+    )
+    for conversation in conversations:
+        for chat in by_key[conversation.key]:
+            if str(chat.user2_id) == str(conversation.user1_id):
+                conversation.user1_unread += 1
+            else:
+                conversation.user2_unread += 1
+            if conversation.last_message_id is None or chat.created_at >= conversation.last_activity:
+                conversation.last_message = chat
+                conversation.last_activity = chat.created_at
+
+    Conversation.objects.bulk_update(
+        conversations, ['last_message', 'last_activity', 'user1_unread', 'user2_unread']
+    )
+    invalidate_unread_totals(chat.user2_id for chat in chats)
+
+
+def create_message(sender, recipient, message):
+    """Lưu một tin nhắn và cập nhật Conversation trong cùng transaction"""
+    with transaction.atomic():
+        chat = Chat.objects.create(user1=sender, user2=recipient, message=message)
+        record_messages([chat])
+    return chat
+
+
+def mark_read(user, other_user_id, up_to=None):
+    """
+    Đánh dấu đã đọc mọi tin nhắn user nhận trong cuộc trò chuyện, tới `up_to` (id tin nhắn,
+    None -> tất cả), bằng một câu UPDATE duy nhất trên partial index chat_unread_idx.
+
+    Returns:
+        tuple: (số tin vừa được đánh dấu, số tin còn chưa đọc trong cuộc trò chuyện)
+
+    Raises:
+        ValueError: nếu `up_to` không phải tin nhắn của cuộc trò chuyện
+    """
+    key = conversation_key(user.id, other_user_id)
+    with transaction.atomic():
+        # Khoá Conversation để bộ đếm không lệch với record_messages chạy song song
+        conversation = Conversation.objects.select_for_update().filter(key=key).first()
+        if conversation is None:
+            return 0, 0
+
+        messages = Chat.objects.filter(conversation_key=key, user2_id=user.id, is_read=False)
+        if up_to:
+            try:
+                cursor = Chat.objects.filter(conversation_key=key, id=up_to).values('created_at', 'id').first()
+            except ValidationError:
+                cursor = None
+            if cursor is None:
+                raise ValueError('Message not found')
+            messages = messages.filter(
+                Q(created_at__lt=cursor['created_at']) | Q(created_at=cursor['created_at'], id__lte=cursor['id'])
+            )
+
+        marked = messages.update(is_read=True)
+        field = 'user1_unread' if str(user.id) == str(conversation.user1_id) else 'user2_unread'
+        unread = max(0, getattr(conversation, field) - marked)
+        if marked:
+            setattr(conversation, field, unread)
+            conversation.save(update_fields=[field])
+            invalidate_unread_totals([user.id])
+    return marked, unread
+
+
+def read_receipt_event(key, reader_id, up_to, marked):
+    """Event gửi qua channel layer tới các group của cuộc trò chuyện (send_to_conversation)"""
+    return {
+        'type': 'read_receipt',
+        'conversation_key': key,
+        'reader': str(reader_id),
+        'up_to': str(up_to) if up_to else None,
+        'count': marked
+    }
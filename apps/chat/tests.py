@@ -1,3 +1,35 @@
-from django.test import TestCase
+from rest_framework.test import APITestCase
+from apps.users.models import User
+from .services import create_message
 
-# Create your tests here.
+
+class ConversationListTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='me', password='x', email='me@x.com')
+        self.others = [
+            User.objects.create_user(username=f'u{i}', password='x', email=f'u{i}@x.com')
+            for i in range(5)
+        ]
+        for other in self.others:
+            create_message(other, self.user, f'from {other.username}')
+        create_message(self.user, self.user, 'note to self')
+        self.client.force_authenticate(self.user)
+
+    def test_pages_inbox_newest_first(self):
+        response = self.client.get('/api/chats/', {'limit': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['has_more'])
+        first = [row['username'] for row in response.data['results']]
+        self.assertEqual(first, ['me', 'u4', 'u3', 'u2'])
+
+        response = self.client.get('/api/chats/', {'limit': 4, 'cursor': response.data['next_cursor']})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['has_more'])
+        self.assertIsNone(response.data['next_cursor'])
+        self.assertEqual([row['username'] for row in response.data['results']], ['u1', 'u0'])
+        self.assertEqual(response.data['results'][0]['unread_count'], 1)
+        self.assertEqual(response.data['results'][0]['last_message']['message'], 'from u1')
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/chats/', {'cursor': 'zz'})
+        self.assertEqual(response.status_code, 400)
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import ConversationList, MessageList, SearchUsers
+from .views import ConversationList, MessageList, MarkRead, UnreadCount, SearchUsers
 
 urlpatterns = [
     path('chats/', ConversationList.as_view(), name='conversation-list'),
+    path('chats/unread/', UnreadCount.as_view(), name='unread-count'),
     path('chats/<str:other_user_id>/messages/', MessageList.as_view(), name='message-list'),
+    path('chats/<str:other_user_id>/read/', MarkRead.as_view(), name='mark-read'),
     path('chats/users/search/', SearchUsers.as_view(), name='search_users')
 ]
\ No newline at end of file
@@ -1,58 +1,224 @@
+import uuid
+from asgiref.sync import async_to_sync
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.core.exceptions import ValidationError
+from django.db import connections
 from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from apps.users.models import User
-from .models import Chat
+from apps.utils.pagination import encode_cursor, decode_cursor, parse_limit
+from apps.utils.search import search_queryset
+from .models import Chat, Conversation, conversation_key
+from .services import create_message, get_unread_total, mark_read, read_receipt_event, send_to_conversation
 from .serializers import ChatSerializer
 from rest_framework.permissions import IsAuthenticated
 from apps.users.serializers import UserSerializer
 from django.contrib.auth.models import Group
 
+CONVERSATION_PAGE_SIZE = 20
+MAX_CONVERSATION_PAGE_SIZE = 50
+
+CONVERSATION_FIELDS = (
+    'id', 'key', 'last_activity', 'user1_id', 'user2_id', 'user1_unread', 'user2_unread',
+    'user1__username', 'user1__image', 'user2__username', 'user2__image',
+    'last_message_id', 'last_message__user1_id', 'last_message__message', 'last_message__created_at',
+)
+
+
+def decode_conversation_cursor(cursor):
+    """
+    Raises:
+        ValueError: nếu cursor không hợp lệ
+    """
+    last_activity, conversation_id = decode_cursor(cursor, 2)
+    last_activity = parse_datetime(last_activity)
+    if last_activity is None:
+        raise ValueError('Invalid cursor')
+    return last_activity, int(conversation_id)
+
+
 class ConversationList(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
+        """
+        Inbox, mới hoạt động nhất trước; trang sau lấy bằng ?cursor=<next_cursor>.
+
+        UNION của hai lần quét index (user1, -last_activity) và (user2, -last_activity),
+        mỗi nhánh chỉ lấy limit + 1 dòng, thay cho một câu OR phải đọc hết inbox.
+        Backend không cho LIMIT trong từng nhánh của UNION (SQLite) thì dùng câu OR.
+        """
         current_user = request.user
-        user2_list = Chat.objects.filter(user1=current_user).values_list('user2', flat=True).distinct()
-        user1_list = Chat.objects.filter(user2=current_user).values_list('user1', flat=True).distinct()
-        all_users = set(user2_list) | set(user1_list)
-        all_users.discard(current_user.id)
-        conversations = User.objects.filter(id__in=all_users).values('id', 'username','image')
-        return Response(conversations)
+        limit = parse_limit(request.query_params.get('limit'), CONVERSATION_PAGE_SIZE, MAX_CONVERSATION_PAGE_SIZE)
+
+        after = Q()
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                last_activity, conversation_id = decode_conversation_cursor(cursor)
+            except ValueError:
+                return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+            after = Q(last_activity__lt=last_activity) | Q(last_activity=last_activity, id__lt=conversation_id)
+
+        def branch(*members):
+            return (
+                Conversation.objects.filter(after, *members)
+                .values(*CONVERSATION_FIELDS)
+                .order_by('-last_activity', '-id')[:limit + 1]
+            )
+
+        if connections[Conversation.objects.db].features.supports_slicing_ordering_in_compound:
+            # union() bỏ dòng trùng (tự nhắn cho mình có mặt ở cả hai nhánh)
+            page = list(
+                branch(Q(user1=current_user)).union(branch(Q(user2=current_user)))
+                .order_by('-last_activity', '-id')[:limit + 1]
+            )
+        else:
+            page = list(branch(Q(user1=current_user) | Q(user2=current_user)))
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        data = []
+        for row in page:
+            other = 'user2' if str(current_user.id) == str(row['user1_id']) else 'user1'
+            mine = 'user1' if other == 'user2' else 'user2'
+            data.append({
+                'id': row[f'{other}_id'],
+                'username': row[f'{other}__username'],
+                'image': row[f'{other}__image'],
+                'conversation_key': row['key'],
+                'last_activity': row['last_activity'],
+                'unread_count': row[f'{mine}_unread'],
+                'last_message': {
+                    'id': row['last_message_id'],
+                    'message': row['last_message__message'],
+                    'sender': row['last_message__user1_id'],
+                    'created_at': row['last_message__created_at'],
+                } if row['last_message_id'] else None,
+            })
+        return Response({
+            'results': data,
+            'has_more': has_more,
+            'next_cursor': encode_cursor(page[-1]['last_activity'].isoformat(), page[-1]['id']) if has_more else None
+        })
+
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 100
+
+
+def get_other_user(other_user_id):
+    try:
+        return User.objects.filter(id=other_user_id).only('id').first()
+    except ValidationError:
+        return None
+
+
+def decode_message_cursor(cursor):
+    """
+    Raises:
+        ValueError: nếu cursor không hợp lệ
+    """
+    created_at, message_id = decode_cursor(cursor, 2)
+    created_at = parse_datetime(created_at)
+    if created_at is None:
+        raise ValueError('Invalid cursor')
+    return created_at, uuid.UUID(message_id)
+
 
 class MessageList(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, other_user_id):
-        current_user = request.user
-        other_user = User.objects.get(id=other_user_id)
-        messages = Chat.objects.filter(
-            Q(user1=current_user, user2=other_user) | Q(user1=other_user, user2=current_user)
-        ).order_by('created_at')
-        serializer = ChatSerializer(messages, many=True)
-        return Response(serializer.data)
+        """
+        Một trang tin nhắn (cũ -> mới), cursor lấy từ trang trước:
+            ?before=<before_cursor>  trang cũ hơn
+            ?after=<after_cursor>    trang mới hơn
+            không có cursor -> trang mới nhất
+        """
+        other_user = get_other_user(other_user_id)
+        if other_user is None:
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        limit = parse_limit(request.query_params.get('limit'), MESSAGE_PAGE_SIZE, MAX_MESSAGE_PAGE_SIZE)
+        messages = Chat.objects.filter(conversation_key=conversation_key(request.user.id, other_user.id))
+
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        # Có cả hai thì ưu tiên before
+        newer = bool(after) and not before
+        try:
+            if before:
+                created_at, message_id = decode_message_cursor(before)
+                messages = messages.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+                )
+            elif after:
+                created_at, message_id = decode_message_cursor(after)
+                messages = messages.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+                )
+        except ValueError:
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if newer:
+            page = list(messages.order_by('created_at', 'id')[:limit + 1])
+        else:
+            page = list(messages.order_by('-created_at', '-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+        if not newer:
+            page.reverse()
+
+        return Response({
+            'results': ChatSerializer(page, many=True).data,
+            'has_more': has_more,
+            'before_cursor': encode_cursor(page[0].created_at.isoformat(), page[0].id) if page else before,
+            'after_cursor': encode_cursor(page[-1].created_at.isoformat(), page[-1].id) if page else after
+        })
 
     def post(self, request, other_user_id):
         current_user = request.user
-        other_user = User.objects.get(id=other_user_id)
+        other_user = get_other_user(other_user_id)
+        if other_user is None:
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
         serializer = ChatSerializer(data=request.data)
         if serializer.is_valid():
-            if current_user.id < other_user.id:
-                user1 = current_user
-                user2 = other_user
-            else:
-                user1 = other_user
-                user2 = current_user
-            chat = Chat.objects.create(
-                user1=user1,
-                user2=user2,
-                message=serializer.validated_data['message']
-            )
+            # Giống ChatConsumer: user1 luôn là người gửi
+            chat = create_message(current_user, other_user, serializer.validated_data['message'])
             return Response(ChatSerializer(chat).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class MarkRead(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, other_user_id):
+        """Đánh dấu đã đọc tới tin nhắn `up_to` (bỏ trống -> tất cả) và báo cho người gửi"""
+        other_user = get_other_user(other_user_id)
+        if other_user is None:
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        up_to = request.data.get('up_to')
+        try:
+            marked, unread = mark_read(request.user, other_user.id, up_to)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if marked:
+            key = conversation_key(request.user.id, other_user.id)
+            async_to_sync(send_to_conversation)(key, read_receipt_event(key, request.user.id, up_to, marked))
+        return Response({'marked': marked, 'unread_count': unread})
+
+
+class UnreadCount(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread': get_unread_total(request.user.id)})
+
+
 class SearchUsers(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -76,12 +242,8 @@ class SearchUsers(APIView):
         if admin_group:
             users = users.exclude(groups=admin_group)
 
-        # Search by username, first_name or last_name
-        users = users.filter(
-            Q(username__icontains=query) |
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query)
-        )[:10]
+        # Search by username, first_name or last_name (best matches first)
+        users = search_queryset(users, query, ['username', 'first_name', 'last_name'])[:10]
 
         # Serialize only necessary fields
         data = users.values('id', 'username', 'image', 'first_name', 'last_name')
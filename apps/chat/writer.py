@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import weakref
+from channels.db import database_sync_to_async
+from django.db import transaction
+from .models import Chat, conversation_key
+from .services import record_messages
+
+logger = logging.getLogger(__name__)
+
+# Flush khi đủ FLUSH_BATCH_SIZE tin nhắn hoặc sau FLUSH_INTERVAL giây kể từ tin đầu tiên
+FLUSH_BATCH_SIZE = 100
+FLUSH_INTERVAL = 0.05
+# Hàng đợi đầy -> submit() chờ, consumer ngừng đọc socket (backpressure)
+MAX_PENDING_MESSAGES = 2000
+
+
+class MessageWriter:
+    """
+    Ghi tin nhắn chat theo lô (write-behind) cho một event loop của worker.
+
+    Consumer broadcast tin nhắn ngay, rồi submit() bản Chat chưa lưu; future trả về
+    chỉ hoàn thành sau khi transaction chứa bulk_create đã commit, nên ack gửi cho
+    client sau khi await future đảm bảo tin nhắn đã nằm trong DB.
+    """
+
+    def __init__(self, batch_size=FLUSH_BATCH_SIZE, interval=FLUSH_INTERVAL, max_pending=MAX_PENDING_MESSAGES):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self._task = None
+
+    async def submit(self, chat):
+        """
+        Returns:
+            asyncio.Future: kết quả là `chat` khi đã lưu, exception nếu flush lỗi
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((chat, future))
+        return future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        chats = [chat for chat, _ in batch]
+        try:
+            await database_sync_to_async(self.write)(chats)
+        except Exception:
+            logger.exception(f"Failed to persist {len(chats)} chat messages, retrying one by one")
+            # Lô chứa tin của nhiều user: ghi lại từng tin để chỉ tin lỗi bị báo message_error
+            for chat, future in batch:
+                try:
+                    await database_sync_to_async(self.write)([chat])
+                except Exception as e:
+                    logger.exception(f"Failed to persist chat message {chat.id}")
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(chat)
+            return
+        for chat, future in batch:
+            if not future.done():
+                future.set_result(chat)
+
+    def write(self, chats):
+        # bulk_create không gọi save() nên tự điền conversation_key
+        for chat in chats:
+            if not chat.conversation_key:
+                chat.conversation_key = conversation_key(chat.user1_id, chat.user2_id)
+        with transaction.atomic():
+            Chat.objects.bulk_create(chats)
+            record_messages(chats)
+
+
+_writers = weakref.WeakKeyDictionary()
+
+
+def get_message_writer():
+    """Một writer cho mỗi event loop (mỗi worker ASGI)"""
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = _writers[loop] = MessageWriter()
+    return writer
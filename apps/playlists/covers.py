@@ -0,0 +1,78 @@
+import base64
+import binascii
+import logging
+import re
+from io import BytesIO
+from PIL import Image, UnidentifiedImageError
+from apps.songs.cloudinary_helper import CloudinaryUploader
+
+logger = logging.getLogger(__name__)
+
+COVER_FOLDER = 'spotify/playlists'
+COVER_MAX_SIZE = (640, 640)
+COVER_QUALITY = 85
+MAX_COVER_BYTES = 10 * 1024 * 1024  # giống giới hạn ảnh của SongForm
+DATA_URI_PATTERN = re.compile(r'^data:image/(png|jpeg|jpg);base64,')
+
+
+def is_base64_image(value):
+    return bool(value) and bool(DATA_URI_PATTERN.match(value))
+
+
+def decode_cover(data_uri):
+    """
+    Decode ảnh base64, kiểm tra bằng Pillow và thu nhỏ về COVER_MAX_SIZE.
+
+    Returns:
+        BytesIO: ảnh JPEG đã resize
+
+    Raises:
+        ValueError: nếu dữ liệu không phải ảnh PNG/JPEG hợp lệ
+    """
+    match = DATA_URI_PATTERN.match(data_uri or '')
+    if not match:
+        raise ValueError('Invalid base64 image format')
+
+    try:
+        raw = base64.b64decode(data_uri[match.end():], validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError('Invalid base64 image data')
+    if len(raw) > MAX_COVER_BYTES:
+        raise ValueError('Image size must be under 10MB')
+
+    try:
+        # verify() làm hỏng object, phải mở lại để xử lý
+        Image.open(BytesIO(raw)).verify()
+        image = Image.open(BytesIO(raw))
+        if image.format not in ('PNG', 'JPEG'):
+            raise ValueError('Only PNG or JPEG images are allowed')
+        image.thumbnail(COVER_MAX_SIZE)
+        image = image.convert('RGB')
+    except ValueError:
+        raise
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        # PNG hỏng (vd sai CRC) làm Pillow raise SyntaxError
+        raise ValueError('Invalid image data')
+
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=COVER_QUALITY, optimize=True)
+    output.seek(0)
+    output.name = 'cover.jpg'
+    return output
+
+
+def upload_cover(data_uri):
+    """
+    Returns:
+        str: URL ảnh trên Cloudinary, None nếu upload thất bại
+
+    Raises:
+        ValueError: nếu ảnh không hợp lệ
+    """
+    return CloudinaryUploader().upload_image(decode_cover(data_uri), folder=COVER_FOLDER)
+
+
+def delete_cover(url):
+    """Xoá ảnh cũ trên Cloudinary (bỏ qua giá trị base64 / URL ngoài)"""
+    if url and url.startswith('http'):
+        CloudinaryUploader().delete_file(url, resource_type='image')
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.playlists.models import Playlist
+from apps.users.models import User
+from apps.utils.search import is_postgres
+
+# Các cột được tìm kiếm bởi apps.utils.search.search_queryset
+SEARCH_FIELDS = {
+    Playlist: ['title', 'description'],
+    User: ['username', 'email', 'first_name', 'last_name'],
+}
+
+class Command(BaseCommand):
+    help = 'Create the pg_trgm extension and GIN trigram indexes used by playlist/user search'
+
+    def handle(self, *args, **options):
+        if not is_postgres():
+            self.stdout.write('Not a PostgreSQL database, search falls back to icontains')
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for model, fields in SEARCH_FIELDS.items():
+                table = model._meta.db_table
+                for name in fields:
+                    column = model._meta.get_field(name).column
+                    quoted = connection.ops.quote_name(column)
+                    # Cột gốc cho trigram_similar (col % query), UPPER(col) cho icontains
+                    # (Django sinh UPPER(col::text) LIKE UPPER('%query%'))
+                    for index, expression in (
+                        (f'{table}_{column}_trgm', quoted),
+                        (f'{table}_{column}_upper_trgm', f'UPPER({quoted})'),
+                    ):
+                        # CONCURRENTLY để không khoá bảng khi tạo index trên production
+                        cursor.execute(
+                            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {connection.ops.quote_name(index)} '
+                            f'ON {connection.ops.quote_name(table)} '
+                            f'USING gin ({expression} gin_trgm_ops)'
+                        )
+                        self.stdout.write(f'Index {index} ready')
+
+        self.stdout.write(self.style.SUCCESS('Search indexes created'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from apps.playlists.covers import upload_cover
+from apps.playlists.models import Playlist
+
+class Command(BaseCommand):
+    help = 'Upload base64 playlist covers to Cloudinary and replace them with their URL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = list(
+            Playlist.objects.filter(image__startswith='data:')
+            .order_by('id').values_list('id', flat=True)
+        )
+        migrated, skipped = 0, 0
+
+        # Mỗi batch chỉ giữ batch_size ảnh base64 trong bộ nhớ
+        for start in range(0, len(ids), batch_size):
+            playlists = list(Playlist.objects.filter(id__in=ids[start:start + batch_size]).only('id', 'image'))
+            updated = []
+            for playlist in playlists:
+                try:
+                    url = upload_cover(playlist.image)
+                except ValueError as e:
+                    self.stderr.write(f'Skipped playlist {playlist.id}: {e}')
+                    skipped += 1
+                    continue
+                if not url:
+                    self.stderr.write(f'Skipped playlist {playlist.id}: upload failed')
+                    skipped += 1
+                    continue
+                playlist.image = url
+                updated.append(playlist)
+
+            Playlist.objects.bulk_update(updated, ['image'])
+            migrated += len(updated)
+            self.stdout.write(f'Migrated {migrated}/{len(ids)} covers')
+
+        self.stdout.write(self.style.SUCCESS(f'Migrated {migrated} playlist covers, skipped {skipped}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F
+from apps.playlists.models import Playlist
+
+class Command(BaseCommand):
+    help = 'Repair drift between Playlist.song_count and the actual number of SongPlaylist rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drifted = list(
+            Playlist.objects.annotate(actual=Count('song_playlists'))
+            .exclude(song_count=F('actual'))
+            .only('id', 'song_count')
+        )
+        for playlist in drifted:
+            playlist.song_count = playlist.actual
+
+        Playlist.objects.bulk_update(drifted, ['song_count'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Repaired song_count for {len(drifted)} playlists'))
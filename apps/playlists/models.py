@@ -11,6 +11,8 @@ class Playlist(models.Model):
     image = models.TextField(blank=True, null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_playlist', null=False)
     is_likedSong_playlist = models.BooleanField(default=False)
+    # Denormalized, cập nhật bởi signal của SongPlaylist (reconcile_playlist_counts để sửa lệch)
+    song_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.title
@@ -1,16 +1,23 @@
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.http import JsonResponse
 from .models import Playlist
-import re
+from .covers import is_base64_image, upload_cover, delete_cover
+from apps.song_playlist.models import SongPlaylist
+from apps.song_playlist.services import copy_playlist_songs, refresh_song_count, invalidate_liked_song_ids
+from apps.songs.recommendations import mark_playlist_stale
+from apps.utils.fields import project
+from apps.utils.search import search_queryset
 
-# ------------------------ HELPER FUNCTION --------------------------
-def validate_base64_image(base64_string):
-     if not base64_string:
-         return True
-     pattern = r'^data:image/(png|jpeg|jpg);base64,'
-     return bool(re.match(pattern, base64_string))
+PLAYLIST_FIELDS = ['id', 'title', 'description', 'song_count', 'image', 'is_liked_song', 'user']
+COPY_SUFFIX = ' (copy)'
 
+# ------------------------ HELPER FUNCTION --------------------------
+def copy_title(title):
+    """Tên bản sao, cắt bớt tên gốc để vẫn vừa Playlist.title"""
+    max_length = Playlist._meta.get_field('title').max_length
+    return title[:max_length - len(COPY_SUFFIX)] + COPY_SUFFIX
 
 def get_user_data(user):
     return {
@@ -23,6 +30,36 @@ def get_user_data(user):
         'status': user.status,
     }
 
+
+def get_playlist_data(playlist, fields=None):
+    fields = PLAYLIST_FIELDS if fields is None else fields
+    # Chỉ tính những field được yêu cầu
+    getters = {
+        'id': lambda: str(playlist.id),
+        'title': lambda: playlist.title,
+        'description': lambda: playlist.description,
+        'song_count': lambda: playlist.song_count,
+        'image': lambda: playlist.image,
+        'is_liked_song': lambda: playlist.is_likedSong_playlist,
+        'user': lambda: get_user_data(playlist.user),
+    }
+    return {name: getters[name]() for name in fields if name in getters}
+
+
+def release_cover(url):
+    # Playlist duplicate dùng chung URL ảnh bìa -> chỉ xoá khi không còn playlist nào dùng
+    if url and not Playlist.objects.filter(image=url).exists():
+        delete_cover(url)
+
+
+def playlist_queryset(queryset, fields=None):
+    if fields is None or 'user' in fields:
+        queryset = queryset.select_related('user')
+    # Playlist cũ (chưa chạy migrate_playlist_covers) có thể còn ảnh base64 rất lớn
+    if fields is not None and 'image' not in fields:
+        queryset = queryset.defer('image')
+    return queryset
+
 # -----------------------------HANDLE ---------------------------------
 def create_playlist(data, user):
     title = data.get('title')
@@ -49,10 +86,8 @@ def create_playlist(data, user):
     }, status=201)
 
 
-def update_playlist(playlist, data, user):
-    is_admin = user.groups.filter(name__in=['admin', 'full_role']).exists()
-
-    if playlist.user != user and not is_admin:
+def update_playlist(playlist, data, user, is_admin=False):
+    if playlist.user_id != user.id and not is_admin:
         return JsonResponse({
             'message': 'You do not have permission to edit this playlist'
         }, status=403)
@@ -60,16 +95,29 @@ def update_playlist(playlist, data, user):
     title = data.get('title', playlist.title)
     description = data.get('description', playlist.description)
     image = data.get('image', playlist.image)
-
-    if image and not validate_base64_image(image):
-        return JsonResponse({
-            'status': 'error', 'message': 'Invalid base64 image format'
-        }, status=400)
+    old_image = playlist.image
+
+    # Ảnh mới gửi lên dạng base64 -> resize và upload, trong DB chỉ lưu URL
+    if image and image != old_image:
+        if not is_base64_image(image):
+            return JsonResponse({
+                'status': 'error', 'message': 'Invalid base64 image format'
+            }, status=400)
+        try:
+            image = upload_cover(image)
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        if not image:
+            return JsonResponse({
+                'status': 'error', 'message': 'Failed to upload image'
+            }, status=502)
 
     playlist.title = title
     playlist.description = description
-    playlist.image = image
+    playlist.image = image or None
     playlist.save()
+    if old_image and old_image != playlist.image:
+        release_cover(old_image)
     return JsonResponse({
         'message': 'Playlist updated successfully',
         'id': str(playlist.id),
@@ -80,65 +128,131 @@ def update_playlist(playlist, data, user):
     }, status=200)
 
 
-def delete_playlist(playlist, user):
-    is_admin = user.groups.filter(name__in=['admin', 'full_role']).exists()
-
-    if playlist.user != user and not is_admin:
+def delete_playlist(playlist, user, is_admin=False):
+    if playlist.user_id != user.id and not is_admin:
         return JsonResponse({
             'message': 'You do not have permission to delete this playlist'
         }, status=403)
 
+    image = playlist.image
     playlist.delete()
+    release_cover(image)
     return JsonResponse({
         'message': 'Playlist deleted successfully'
     }, status=200)
 
 
-def get_playlist(playlist, user):
-    is_admin = user.groups.filter(name__in=['admin', 'full_role']).exists()
-
-    if playlist.user != user and not is_admin:
+def duplicate_playlist(source, data, user, is_admin=False):
+    """
+    Tạo bản sao của playlist cho user hiện tại: dùng lại URL ảnh bìa (không upload lại)
+    và copy bài hát bằng một câu INSERT ... SELECT.
+    """
+    if source.user_id != user.id and not is_admin:
         return JsonResponse({
             'message': 'You do not have permission to view this playlist'
         }, status=403)
 
+    with transaction.atomic():
+        playlist = Playlist.objects.create(
+            title=data.get('title') or copy_title(source.title),
+            description=data.get('description', source.description),
+            image=source.image,
+            user=user
+        )
+        copied = copy_playlist_songs(source.id, playlist.id)
+        playlist.song_count = copied
+        playlist.save(update_fields=['song_count'])
+        mark_playlist_stale(playlist.id)
+
     return JsonResponse({
+        'message': 'Playlist duplicated successfully',
+        **get_playlist_data(playlist),
+        'copied': copied
+    }, status=201)
+
+
+def merge_playlists(target, source_id, user, delete_source=False, is_admin=False):
+    """
+    Thêm các bài hát của playlist nguồn vào cuối playlist đích (bỏ qua bài đã có),
+    giữ thứ tự của playlist nguồn.
+    """
+    if target.user_id != user.id:
+        return JsonResponse({
+            'message': 'You do not have permission to modify this playlist'
+        }, status=403)
+
+    try:
+        source = Playlist.objects.get(id=source_id)
+    except (Playlist.DoesNotExist, ValueError, ValidationError):
+        return JsonResponse({'message': 'Source playlist not found'}, status=404)
+
+    if source.id == target.id:
+        return JsonResponse({'message': 'Cannot merge a playlist into itself'}, status=400)
+    if source.user_id != user.id and not is_admin:
+        return JsonResponse({
+            'message': 'You do not have permission to view the source playlist'
+        }, status=403)
+    if delete_source and source.user_id != user.id:
+        return JsonResponse({
+            'message': 'You do not have permission to delete the source playlist'
+        }, status=403)
+
+    with transaction.atomic():
+        # Khoá playlist đích để hai lần merge đồng thời không dùng chung prefix
+        Playlist.objects.select_for_update().filter(id=target.id).exists()
+        copied = copy_playlist_songs(source.id, target.id, prefix=SongPlaylist.last_position(target.id))
+        refresh_song_count(target.id)
+        mark_playlist_stale(target.id)
+        if delete_source:
+            # SongPlaylist của nguồn bị xoá cascade bằng một câu DELETE (signal pre_delete
+            # của Playlist đánh dấu neighbors)
+            source.delete()
+
+    if delete_source:
+        release_cover(source.image)
+    if target.is_likedSong_playlist:
+        invalidate_liked_song_ids(target.user_id)
+
+    target.refresh_from_db(fields=['song_count'])
+    return JsonResponse({
+        'message': f'{copied} songs merged into {target.title}',
+        **get_playlist_data(target),
+        'copied': copied
+    }, status=200)
+
+def get_playlist(playlist, user, fields=None, is_admin=False):
+    if playlist.user_id != user.id and not is_admin:
+        return JsonResponse({
+            'message': 'You do not have permission to view this playlist'
+        }, status=403)
+
+    return JsonResponse(project({
         'id': str(playlist.id),
         'title': playlist.title,
         'description': playlist.description,
+        'song_count': playlist.song_count,
         'image': playlist.image,
         'is_liked_song': playlist.is_likedSong_playlist,
         'user': get_user_data(playlist.user)
-    }, status=200)
+    }, fields), status=200)
 
-def get_user_playlists(user):
+def get_user_playlists(user, fields=None):
     if not user.is_authenticated:
         return JsonResponse({
             'message': 'User not authenticated'
         }, status=401)
 
-    playlists = Playlist.objects.filter(user=user)
-    playlists_data = [
-        {
-            'id': str(playlist.id),
-            'title': playlist.title,
-            'description': playlist.description,
-            'song_count': playlist.song_playlists.count(),
-            'image': playlist.image,
-            'is_liked_song': playlist.is_likedSong_playlist,
-            'user': get_user_data(playlist.user)
-        }
-        for playlist in playlists
-    ]
+    playlists = playlist_queryset(Playlist.objects.filter(user=user), fields)
+    playlists_data = [get_playlist_data(playlist, fields) for playlist in playlists]
     return JsonResponse({
         'message': 'Playlists retrieved successfully',
         'playlists': playlists_data
     }, status=200)
 
-def search_playlists(user, query, page=1, page_size=10):
-    playlists = Playlist.objects.filter(user=user).filter(
-        Q(title__icontains=query) | Q(description__icontains=query)
-    ).order_by('id')
+def search_playlists(user, query, page=1, page_size=10, fields=None):
+    playlists = search_queryset(
+        playlist_queryset(Playlist.objects.filter(user=user), fields), query, ['title', 'description']
+    )
 
     paginator = Paginator(playlists, page_size)
     try:
@@ -148,18 +262,7 @@ def search_playlists(user, query, page=1, page_size=10):
     except EmptyPage:
         paginated_playlists = paginator.page(paginator.num_pages)
 
-    playlists_data = [
-        {
-            'id': str(playlist.id),
-            'title': playlist.title,
-            'description': playlist.description,
-            'song_count': playlist.song_playlists.count(),
-            'image': playlist.image,
-            'user': get_user_data(playlist.user)
-        }
-        for playlist in paginated_playlists
-    ]
-    print(playlists_data)
+    playlists_data = [get_playlist_data(playlist, fields) for playlist in paginated_playlists]
 
     return JsonResponse({
         'message': 'Playlists retrieved successfully',
@@ -170,10 +273,10 @@ def search_playlists(user, query, page=1, page_size=10):
         'total_playlists': paginator.count
     }, status=200)
 
-def search_all_playlists(query, page=1, page_size=10):
-    playlists = Playlist.objects.filter(
-        Q(title__icontains=query) | Q(description__icontains=query)
-    ).order_by('id')
+def search_all_playlists(query, page=1, page_size=10, fields=None):
+    playlists = search_queryset(
+        playlist_queryset(Playlist.objects.all(), fields), query, ['title', 'description']
+    )
 
     paginator = Paginator(playlists, page_size)
     try:
@@ -183,18 +286,7 @@ def search_all_playlists(query, page=1, page_size=10):
     except EmptyPage:
         paginated_playlists = paginator.page(paginator.num_pages)
 
-    playlists_data = [
-        {
-            'id': str(playlist.id),
-            'title': playlist.title,
-            'description': playlist.description,
-            'song_count': playlist.song_playlists.count(),
-            'image': playlist.image,
-            'is_liked_song': playlist.is_likedSong_playlist,
-            'user': get_user_data(playlist.user)
-        }
-        for playlist in paginated_playlists
-    ]
+    playlists_data = [get_playlist_data(playlist, fields) for playlist in paginated_playlists]
 
     return JsonResponse({
         'message': 'All playlists retrieved successfully',
@@ -205,8 +297,8 @@ def search_all_playlists(query, page=1, page_size=10):
         'total_playlists': paginator.count
     }, status=200)
 
-def get_all_playlists(page=1, page_size=10):
-    playlists = Playlist.objects.all().order_by('id')
+def get_all_playlists(page=1, page_size=10, fields=None):
+    playlists = playlist_queryset(Playlist.objects.all(), fields).order_by('id')
 
     paginator = Paginator(playlists, page_size)
     try:
@@ -216,18 +308,7 @@ def get_all_playlists(page=1, page_size=10):
     except EmptyPage:
         paginated_playlists = paginator.page(paginator.num_pages)
 
-    playlists_data = [
-        {
-            'id': str(playlist.id),
-            'title': playlist.title,
-            'description': playlist.description,
-            'song_count': playlist.song_playlists.count(),
-            'image': playlist.image,
-            'is_liked_song': playlist.is_likedSong_playlist,
-            'user': get_user_data(playlist.user)
-        }
-        for playlist in paginated_playlists
-    ]
+    playlists_data = [get_playlist_data(playlist, fields) for playlist in paginated_playlists]
 
     return JsonResponse({
         'message': 'All playlists retrieved successfully',
@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from .models import Playlist
 from apps.users.models import User
+from apps.users.permissions import has_admin_role
 from .services import (
     create_playlist,
     update_playlist,
@@ -14,9 +15,13 @@ from .services import (
     search_playlists,
     get_all_playlists,
     search_all_playlists,
+    duplicate_playlist,
+    merge_playlists,
+    PLAYLIST_FIELDS,
 )
 import json
 
+from ..utils.fields import parse_fields
 from ..utils.response import error_response
 
 
@@ -32,11 +37,11 @@ def createPlaylist(request):
             playlist, response = create_playlist(data, user)
             return response
         except json.JSONDecodeError:
-            return error_response("Invalid JSON data", status_code=400)
+            return error_response("Invalid JSON data", status=400)
         except Exception as e:
             print(f"Error in createPlaylist: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Update Playlist
 @csrf_exempt
@@ -50,15 +55,15 @@ def updatePlaylist(request, id):
             try:
                 playlist = Playlist.objects.get(id=id)
             except Playlist.DoesNotExist:
-                return error_response("Playlist not found", status_code=404)
-            response = update_playlist(playlist, data, user)
+                return error_response("Playlist not found", status=404)
+            response = update_playlist(playlist, data, user, has_admin_role(user, request))
             return response
         except json.JSONDecodeError:
-            return error_response("Invalid JSON data", status_code=400)
+            return error_response("Invalid JSON data", status=400)
         except Exception as e:
             print(f"Error in updatePlaylist: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Delete Playlist
 @csrf_exempt
@@ -71,13 +76,60 @@ def deletePlaylist(request, id):
             try:
                 playlist = Playlist.objects.get(id=id)
             except Playlist.DoesNotExist:
-                return error_response("Playlist not found", status_code=404)
-            response = delete_playlist(playlist, user)
+                return error_response("Playlist not found", status=404)
+            response = delete_playlist(playlist, user, has_admin_role(user, request))
             return response
         except Exception as e:
             print(f"Error in deletePlaylist: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
+
+# Duplicate Playlist
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def duplicatePlaylist(request, id):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body) if request.body else {}
+            try:
+                playlist = Playlist.objects.get(id=id)
+            except Playlist.DoesNotExist:
+                return error_response("Playlist not found", status=404)
+            return duplicate_playlist(playlist, data, request.user, has_admin_role(request.user, request))
+        except json.JSONDecodeError:
+            return error_response("Invalid JSON data", status=400)
+        except Exception as e:
+            print(f"Error in duplicatePlaylist: {str(e)}")
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
+
+# Merge Playlist: thêm bài hát của source_playlist_id vào playlist {id}
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mergePlaylist(request, id):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            source_id = data.get('source_playlist_id')
+            if not source_id:
+                return error_response("source_playlist_id is required", status=400)
+            try:
+                playlist = Playlist.objects.get(id=id)
+            except Playlist.DoesNotExist:
+                return error_response("Playlist not found", status=404)
+            return merge_playlists(
+                playlist, source_id, request.user,
+                delete_source=bool(data.get('delete_source', False)),
+                is_admin=has_admin_role(request.user, request)
+            )
+        except json.JSONDecodeError:
+            return error_response("Invalid JSON data", status=400)
+        except Exception as e:
+            print(f"Error in mergePlaylist: {str(e)}")
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Get Playlist
 @csrf_exempt
@@ -90,13 +142,14 @@ def getPlaylist(request, id):
             try:
                 playlist = Playlist.objects.get(id=id)
             except Playlist.DoesNotExist:
-                return error_response("Playlist not found", status_code=404)
-            response = get_playlist(playlist, user)
+                return error_response("Playlist not found", status=404)
+            fields = parse_fields(request.GET, PLAYLIST_FIELDS)
+            response = get_playlist(playlist, user, fields, has_admin_role(user, request))
             return response
         except Exception as e:
             print(f"Error in getPlaylist: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Get All Playlists
 @csrf_exempt
@@ -107,12 +160,13 @@ def getPlaylists(request):
         try:
             page = request.GET.get("page", "1")
             page_size = request.GET.get("page_size", "10")
-            response = get_all_playlists(page, page_size)
+            fields = parse_fields(request.GET, PLAYLIST_FIELDS)
+            response = get_all_playlists(page, page_size, fields)
             return response
         except Exception as e:
             print(f"Error in getPlaylists: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 @csrf_exempt
 @api_view(['GET'])
@@ -121,14 +175,15 @@ def getUserPlaylists(request, id):
     if request.method == 'GET':
         try:
             user = User.objects.get(id=id)
-            response = get_user_playlists(user)
+            fields = parse_fields(request.GET, PLAYLIST_FIELDS)
+            response = get_user_playlists(user, fields)
             return response
         except User.DoesNotExist:
-            return error_response("User not found", status_code=404)
+            return error_response("User not found", status=404)
         except Exception as e:
             print(f"Error in getUserPlaylists: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Search Playlists
 @csrf_exempt
@@ -141,12 +196,13 @@ def searchPlaylists(request):
             page = request.GET.get("page", "1")
             page_size = request.GET.get("page_size", "10")
             user = request.user
-            response = search_playlists(user, query, page, page_size)
+            fields = parse_fields(request.GET, PLAYLIST_FIELDS)
+            response = search_playlists(user, query, page, page_size, fields)
             return response
         except Exception as e:
             print(f"Error in searchPlaylists: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 @csrf_exempt
 @api_view(['GET'])
@@ -158,12 +214,12 @@ def searchAllPlaylists(request):
             page = request.GET.get("page", "1")
             page_size = request.GET.get("page_size", "10")
             user = request.user
-            is_admin = user.groups.filter(name__in=['admin', 'full_role']).exists()
-            if not is_admin:
-                return error_response("Permission denied", status_code=403)
-            response = search_all_playlists(query, page, page_size)
+            if not has_admin_role(user, request):
+                return error_response("Permission denied", status=403)
+            fields = parse_fields(request.GET, PLAYLIST_FIELDS)
+            response = search_all_playlists(query, page, page_size, fields)
             return response
         except Exception as e:
             print(f"Error in searchAllPlaylists: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
\ No newline at end of file
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
\ No newline at end of file
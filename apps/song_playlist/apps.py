@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SongPlaylistConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.song_playlist'
+
+    def ready(self):
+        from . import signals  # noqa: F401
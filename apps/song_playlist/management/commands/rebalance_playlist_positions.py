@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.db.models.functions import Length
+from apps.song_playlist.models import SongPlaylist
+from apps.song_playlist.ranking import MAX_KEY_LENGTH
+from apps.song_playlist.services import rebalance_playlist_positions
+
+class Command(BaseCommand):
+    help = ('Reassign evenly spaced position keys for playlists whose keys grew too long '
+            'or that still have unranked tracks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebalance every playlist')
+
+    def handle(self, *args, **options):
+        song_playlists = SongPlaylist.objects.all()
+        if not options['all']:
+            song_playlists = song_playlists.annotate(key_length=Length('position')).filter(
+                Q(key_length__gt=MAX_KEY_LENGTH) | Q(position='')
+            )
+        playlist_ids = song_playlists.values_list('playlist_id', flat=True).distinct()
+
+        total = 0
+        for playlist_id in playlist_ids.iterator():
+            rebalance_playlist_positions(playlist_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebalanced {total} playlists'))
@@ -1,12 +1,36 @@
 from django.db import models
+from django.utils import timezone
 from apps.songs.models import Song
 from apps.playlists.models import Playlist
+from .ranking import rank_after
 import uuid
 
 class SongPlaylist(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name='song_playlists')
     song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name='song_playlists')
+    added_at = models.DateTimeField(default=timezone.now)
+    # Rank key (xem ranking.py): chèn/di chuyển bài hát chỉ cập nhật một dòng
+    position = models.CharField(max_length=64, default='', blank=True)
 
     def __str__(self):
         return f"{self.song.song_name} in {self.playlist.title}"
+
+    @classmethod
+    def last_position(cls, playlist_id):
+        return cls.objects.filter(playlist_id=playlist_id).order_by('-position') \
+            .values_list('position', flat=True).first()
+
+    def save(self, *args, **kwargs):
+        # Mặc định thêm vào cuối playlist
+        if not self.position:
+            self.position = rank_after(self.last_position(self.playlist_id))
+        super().save(*args, **kwargs)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['playlist', 'song'], name='unique_song_per_playlist'),
+        ]
+        indexes = [
+            models.Index(fields=['playlist', 'position', 'id']),
+        ]
@@ -0,0 +1,85 @@
+# Rank key theo thứ tự từ điển cho SongPlaylist.position.
+#
+# Key chỉ dùng 0-9a-z để collation của DB (C hay en_US) sắp xếp giống Python, và không
+# key nào kết thúc bằng '0' nên luôn chèn được một key đứng trước.
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+# Key thêm vào cuối cách nhau STEP với KEY_WIDTH chữ số, chèn được khoảng BASE ** 3
+# lần vào giữa hai bài kề nhau trước khi key phải dài thêm.
+KEY_WIDTH = 6
+STEP = BASE ** 3
+# Playlist có key dài quá mức này thì được đánh lại
+MAX_KEY_LENGTH = 32
+
+
+def _digit(key, index, default):
+    return DIGITS.index(key[index]) if index < len(key) else default
+
+
+def _to_key(number, width=KEY_WIDTH):
+    digits = []
+    for _ in range(width):
+        number, remainder = divmod(number, BASE)
+        digits.append(DIGITS[remainder])
+    return ''.join(reversed(digits)).rstrip('0')
+
+
+def _to_number(key, width=KEY_WIDTH):
+    number = 0
+    for index in range(width):
+        number = number * BASE + _digit(key, index, 0)
+    return number
+
+
+def rank_between(before=None, after=None):
+    """
+    Key nằm giữa `before` và `after` (không bằng hai đầu; None là không giới hạn).
+
+    Raises:
+        ValueError: nếu before >= after
+    """
+    before = before or ''
+    if after is not None and after <= before:
+        raise ValueError(f'Cannot rank between {before!r} and {after!r}')
+
+    result = []
+    index = 0
+    while True:
+        low = _digit(before, index, 0)
+        high = _digit(after, index, BASE) if after is not None else BASE
+        if high - low > 1:
+            result.append(DIGITS[(low + high) // 2])
+            return ''.join(result)
+
+        result.append(DIGITS[low])
+        if high > low:
+            # Tiền tố đã nhỏ hơn `after`, phần còn lại chỉ cần lớn hơn `before`
+            after = None
+        index += 1
+
+
+def rank_after(key):
+    """Key để thêm vào sau `key` (bài cuối hiện tại)"""
+    if not key:
+        return _to_key(STEP)
+    number = _to_number(key) + STEP
+    if number < BASE ** KEY_WIDTH:
+        return _to_key(number)
+    return rank_between(key, None)
+
+
+def ranks_after(key, count):
+    keys = []
+    for _ in range(count):
+        key = rank_after(key)
+        keys.append(key)
+    return keys
+
+
+def evenly_spaced_ranks(count):
+    """Key mới cách đều cho `count` bài, dùng khi đánh lại playlist"""
+    step = max(BASE ** KEY_WIDTH // (count + 1), 1)
+    width = KEY_WIDTH
+    while step * (count + 1) >= BASE ** width:
+        width += 1
+    return [_to_key(step * (index + 1), width) for index in range(count)]
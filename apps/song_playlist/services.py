@@ -1,9 +1,40 @@
 # apps/song_playlist/services.py
-from django.db.models import Q
+import logging
+import redis
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.db.models import Q, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Length
 from django.http import JsonResponse
+from django.utils import timezone
 from django.shortcuts import render, get_object_or_404
 from .models import Song, SongPlaylist, Playlist
+from .ranking import MAX_KEY_LENGTH, rank_between, ranks_after, evenly_spaced_ranks
+from ..songs.recommendations import mark_playlist_stale
+from ..songs.services import parse_song_ids
 from ..users.models import User
+from ..utils.pagination import encode_cursor, decode_cursor
+from ..utils.redis_client import get_redis, mark_redis_down
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_SONGS = 500
+LIKED_SONGS_CACHE_TIMEOUT = 60 * 60
+TRACKS_PAGE_SIZE = 100
+MAX_TRACKS_PAGE_SIZE = 500
+
+# field trả về -> cột tương ứng (SongPlaylist JOIN Song JOIN Genre)
+TRACK_COLUMNS = {
+    'id': 'song_id',
+    'song_name': 'song__song_name',
+    'singer_name': 'song__singer_name',
+    'genre': 'song__genre__name',
+    'url_audio': 'song__url_audio',
+    'url_video': 'song__url_video',
+    'image': 'song__image',
+    'added_at': 'added_at',
+}
+TRACK_FIELDS = list(TRACK_COLUMNS)
 
 # -------------------------------HELPER FUNCTIONS------------------------------------
 def get_user_or_404(user_id):
@@ -21,23 +52,226 @@ def get_song_or_404(song_id):
 def get_playlist_or_create_liked_songs(user, playlist_id=None, is_liked_song=False):
     try:
         if is_liked_song:
-            try:
-                return Playlist.objects.get(user=user, is_likedSong_playlist=True)
-            except Playlist.DoesNotExist:
-                return Playlist.objects.create(
-                    user=user,
-                    title="Liked Songs",
-                    is_likedSong_playlist=True
-                )
+            playlist, _ = Playlist.objects.get_or_create(
+                user=user,
+                is_likedSong_playlist=True,
+                defaults={'title': "Liked Songs"}
+            )
+            return playlist
         return Playlist.objects.get(id=playlist_id)
     except Playlist.DoesNotExist:
         return None
 
+# -------------------------------LIKED SONGS MEMBERSHIP------------------------------------
+# Redis SET chứa id bài hát user đã thích; phần tử LIKED_SONGS_LOADED đánh dấu tập đã được
+# nạp đủ từ DB (phân biệt với "chưa thích bài nào" hoặc key đã hết hạn).
+LIKED_SONGS_LOADED = '*'
+
+# SADD chỉ khi tập đã được nạp, tránh tạo ra một tập thiếu phần tử
+ADD_IF_LOADED_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 1 then
+    return redis.call('SADD', KEYS[1], unpack(ARGV, 2))
+end
+return 0
+"""
+
+def liked_songs_cache_key(user_id):
+    return f'liked_songs:{user_id}'
+
+def _load_liked_song_ids(client, user_id):
+    song_ids = [
+        str(song_id) for song_id in SongPlaylist.objects.filter(
+            playlist__user_id=user_id, playlist__is_likedSong_playlist=True
+        ).values_list('song_id', flat=True)
+    ]
+    key = liked_songs_cache_key(user_id)
+    pipe = client.pipeline()
+    pipe.delete(key)
+    pipe.sadd(key, LIKED_SONGS_LOADED, *song_ids)
+    pipe.expire(key, LIKED_SONGS_CACHE_TIMEOUT)
+    pipe.execute()
+    return set(song_ids)
+
+def get_liked_song_ids(user_id, song_ids):
+    """
+    Các id trong `song_ids` mà user đã thích: một lệnh SMISMEMBER (kèm phần tử đánh dấu
+    đã nạp) trên Redis; tập chưa nạp thì nạp từ DB, Redis không dùng được thì query DB.
+    """
+    song_ids = [str(song_id) for song_id in song_ids]
+    if not song_ids:
+        return set()
+
+    client = get_redis()
+    if client is not None:
+        key = liked_songs_cache_key(user_id)
+        try:
+            loaded, *members = client.smismember(key, [LIKED_SONGS_LOADED, *song_ids])
+            if loaded:
+                return {song_id for song_id, member in zip(song_ids, members) if member}
+            liked = _load_liked_song_ids(client, user_id)
+            return liked.intersection(song_ids)
+        except redis.RedisError as e:
+            logger.warning(f"Cannot read liked songs from Redis: {e}")
+            mark_redis_down()
+
+    return {
+        str(song_id) for song_id in SongPlaylist.objects.filter(
+            playlist__user_id=user_id, playlist__is_likedSong_playlist=True, song_id__in=song_ids
+        ).values_list('song_id', flat=True)
+    }
+
+def update_liked_song_ids(user_id, added=(), removed=()):
+    """SADD / SREM trên tập liked songs sau khi transaction hiện tại commit"""
+    added = [str(song_id) for song_id in added]
+    removed = [str(song_id) for song_id in removed]
+
+    def apply():
+        client = get_redis()
+        if client is None:
+            return
+        key = liked_songs_cache_key(user_id)
+        try:
+            if removed:
+                client.srem(key, *removed)
+            if added:
+                client.eval(ADD_IF_LOADED_SCRIPT, 1, key, LIKED_SONGS_LOADED, *added)
+        except redis.RedisError as e:
+            logger.warning(f"Cannot update liked songs in Redis: {e}")
+            mark_redis_down()
+            # Không cập nhật được thì bỏ tập, lần đọc sau nạp lại từ DB
+            invalidate_liked_song_ids(user_id)
+
+    if added or removed:
+        transaction.on_commit(apply)
+
+def forget_liked_song(song_id):
+    """Bỏ bài hát sắp bị xoá khỏi tập liked songs của mọi user đã thích nó (một pipeline SREM)"""
+    user_ids = list(
+        SongPlaylist.objects.filter(song_id=song_id, playlist__is_likedSong_playlist=True)
+        .values_list('playlist__user_id', flat=True)
+    )
+    client = get_redis()
+    if client is None or not user_ids:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.srem(liked_songs_cache_key(user_id), str(song_id))
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Cannot update liked songs in Redis: {e}")
+        mark_redis_down()
+
+def invalidate_liked_song_ids(*user_ids):
+    client = get_redis()
+    if client is None or not user_ids:
+        return
+    try:
+        client.delete(*[liked_songs_cache_key(user_id) for user_id in user_ids])
+    except redis.RedisError as e:
+        logger.warning(f"Cannot invalidate liked songs in Redis: {e}")
+        mark_redis_down()
+
+def get_tracks_page(song_playlists, cursor=None, limit=TRACKS_PAGE_SIZE, fields=None):
+    """
+    Một trang bài hát của playlist: một query JOIN song/genre, chỉ SELECT các cột
+    được yêu cầu, keyset pagination theo (position, id) trên index (playlist, position, id).
+    """
+    fields = TRACK_FIELDS if fields is None else fields
+    columns = {TRACK_COLUMNS[name] for name in fields} | {'position', 'id'}
+
+    if cursor:
+        try:
+            position, last_id = decode_cursor(cursor, 2)
+            song_playlists = song_playlists.filter(
+                Q(position__gt=position) | Q(position=position, id__gt=last_id)
+            )
+        except (ValueError, ValidationError):
+            return JsonResponse({'message': 'Invalid cursor'}, status=400)
+
+    rows = list(song_playlists.order_by('position', 'id').values(*columns)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    songs = [
+        {name: str(row[TRACK_COLUMNS[name]]) if name == 'id' else row[TRACK_COLUMNS[name]] for name in fields}
+        for row in rows
+    ]
+    next_cursor = encode_cursor(rows[-1]['position'], rows[-1]['id']) if has_more else None
+    return JsonResponse({
+        'message': 'Songs retrieved successfully',
+        'songs': songs,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }, status=200)
+
 def check_playlist_permission(playlist, user):
-    if playlist.user != user:
+    if playlist.user_id != user.id:
         return False
     return True
 
+def refresh_song_count(playlist_id):
+    song_count = SongPlaylist.objects.filter(playlist_id=OuterRef('pk')) \
+        .values('playlist_id').annotate(total=Count('pk')).values('total')
+    Playlist.objects.filter(pk=playlist_id).update(song_count=Coalesce(Subquery(song_count), Value(0)))
+
+def copy_playlist_songs(source_id, target_id, prefix=None):
+    """
+    Copy bài hát của playlist nguồn sang playlist đích (bỏ qua bài đã có) bằng
+    một câu INSERT ... SELECT trên PostgreSQL, số query không phụ thuộc số bài hát.
+
+    Args:
+        prefix: rank key cuối của playlist đích; position mới = prefix + position nguồn
+                nên bài copy nằm sau bài hiện có và giữ nguyên thứ tự của playlist nguồn.
+                Key dài thêm sau mỗi lần merge: quá MAX_KEY_LENGTH thì đánh lại playlist đích
+
+    Returns:
+        int: số bài hát đã thêm
+    """
+    prefix = prefix or ''
+    added_at = timezone.now()
+    db = SongPlaylist.objects.db
+
+    if connections[db].vendor == 'postgresql':
+        meta = SongPlaylist._meta
+        table = connections[db].ops.quote_name(meta.db_table)
+        playlist_col = meta.get_field('playlist').column
+        song_col = meta.get_field('song').column
+        with connections[db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (id, {playlist_col}, {song_col}, added_at, position) '
+                f'SELECT gen_random_uuid(), %s, source.{song_col}, %s, %s || source.position '
+                f'FROM {table} AS source '
+                f'WHERE source.{playlist_col} = %s AND NOT EXISTS ('
+                f'SELECT 1 FROM {table} AS target '
+                f'WHERE target.{playlist_col} = %s AND target.{song_col} = source.{song_col}) '
+                f'ON CONFLICT ({playlist_col}, {song_col}) DO NOTHING',
+                [target_id, added_at, prefix, source_id, target_id]
+            )
+            copied = cursor.rowcount
+        return _rebalance_if_too_long(target_id, prefix, copied)
+
+    # Backend khác (SQLite): đọc cặp (song_id, position) rồi bulk_create
+    in_target = SongPlaylist.objects.filter(playlist_id=target_id).values('song_id')
+    rows = SongPlaylist.objects.filter(playlist_id=source_id).exclude(song_id__in=in_target) \
+        .values_list('song_id', 'position')
+    created = SongPlaylist.objects.bulk_create(
+        [
+            SongPlaylist(playlist_id=target_id, song_id=song_id, added_at=added_at, position=prefix + position)
+            for song_id, position in rows
+        ],
+        ignore_conflicts=True
+    )
+    return _rebalance_if_too_long(target_id, prefix, len(created))
+
+
+def _rebalance_if_too_long(target_id, prefix, copied):
+    if prefix and copied and SongPlaylist.objects.alias(key_length=Length('position')).filter(
+        playlist_id=target_id, key_length__gt=MAX_KEY_LENGTH
+    ).exists():
+        rebalance_playlist_positions(target_id)
+    return copied
+
 # -------------------------------PLAYLIST------------------------------------
 def addSongToPlaylist(request, playlist_id, song_id, user_id, is_liked_song=False):
     user = get_user_or_404(user_id)
@@ -60,14 +294,190 @@ def addSongToPlaylist(request, playlist_id, song_id, user_id, is_liked_song=Fals
     if SongPlaylist.objects.filter(playlist=playlist, song=song).exists():
         return JsonResponse({'message': f'Song already in {playlist.title}'}, status=400)
 
-    song_playlist = SongPlaylist.objects.create(playlist=playlist, song=song)
+    with transaction.atomic():
+        song_playlist = SongPlaylist.objects.create(playlist=playlist, song=song)
+    if playlist.is_likedSong_playlist:
+        update_liked_song_ids(user.id, added=[song.id])
     return JsonResponse({
         'message': f'Song {song.song_name} added to {playlist.title}',
         'song_id': str(song_playlist.song.id),
         'playlist_id': str(song_playlist.playlist.id)
     }, status=201)
 
-def getSongFromPlaylist(playlist_id, user_id, is_liked_song=False):
+def bulkAddSongsToPlaylist(playlist_id, song_ids, user):
+    """
+    Thêm nhiều bài hát vào playlist với số query cố định (không phụ thuộc số bài hát).
+
+    Returns:
+        JsonResponse: kết quả cho từng song_id (added / already_in_playlist / not_found / invalid)
+    """
+    try:
+        playlist = Playlist.objects.get(id=playlist_id)
+    except Playlist.DoesNotExist:
+        return JsonResponse({'message': 'Playlist not found'}, status=404)
+
+    if playlist.user_id != user.id:
+        return JsonResponse({
+            'message': 'You do not have permission to modify this playlist'
+        }, status=403)
+
+    valid_ids, invalid_ids = parse_song_ids(song_ids)
+    if len(valid_ids) > MAX_BULK_SONGS:
+        return JsonResponse({'message': f'At most {MAX_BULK_SONGS} songs per request'}, status=400)
+
+    existing_songs = {str(song_id) for song_id in Song.objects.filter(id__in=valid_ids).values_list('id', flat=True)}
+    already_added = {
+        str(song_id) for song_id in SongPlaylist.objects.filter(
+            playlist=playlist, song_id__in=existing_songs
+        ).values_list('song_id', flat=True)
+    }
+    to_add = [song_id for song_id in valid_ids if song_id in existing_songs and song_id not in already_added]
+
+    if to_add:
+        with transaction.atomic():
+            positions = ranks_after(SongPlaylist.last_position(playlist.id), len(to_add))
+            SongPlaylist.objects.bulk_create(
+                [
+                    SongPlaylist(playlist=playlist, song_id=song_id, position=position)
+                    for song_id, position in zip(to_add, positions)
+                ],
+                ignore_conflicts=True
+            )
+            refresh_song_count(playlist.id)
+            mark_playlist_stale(playlist.id)
+        if playlist.is_likedSong_playlist:
+            update_liked_song_ids(playlist.user_id, added=to_add)
+
+    results = []
+    for song_id in valid_ids:
+        if song_id not in existing_songs:
+            results.append({'song_id': song_id, 'status': 'not_found'})
+        elif song_id in already_added:
+            results.append({'song_id': song_id, 'status': 'already_in_playlist'})
+        else:
+            results.append({'song_id': song_id, 'status': 'added'})
+    results.extend({'song_id': song_id, 'status': 'invalid'} for song_id in invalid_ids)
+
+    return JsonResponse({
+        'message': f'{len(to_add)} songs added to {playlist.title}',
+        'playlist_id': str(playlist.id),
+        'added': len(to_add),
+        'results': results
+    }, status=200)
+
+def bulkDeleteSongsFromPlaylist(playlist_id, song_ids, user):
+    try:
+        playlist = Playlist.objects.get(id=playlist_id)
+    except Playlist.DoesNotExist:
+        return JsonResponse({'message': 'Playlist not found'}, status=404)
+
+    if playlist.user_id != user.id:
+        return JsonResponse({
+            'message': 'You do not have permission to modify this playlist'
+        }, status=403)
+
+    valid_ids, invalid_ids = parse_song_ids(song_ids)
+    if len(valid_ids) > MAX_BULK_SONGS:
+        return JsonResponse({'message': f'At most {MAX_BULK_SONGS} songs per request'}, status=400)
+
+    song_playlists = SongPlaylist.objects.filter(playlist=playlist, song_id__in=valid_ids)
+    in_playlist = {str(song_id) for song_id in song_playlists.values_list('song_id', flat=True)}
+
+    if in_playlist:
+        with transaction.atomic():
+            # SongPlaylist không có receiver delete -> Django xoá bằng một câu DELETE,
+            # song_count và neighbors được cập nhật một lần bên dưới
+            song_playlists.delete()
+            refresh_song_count(playlist.id)
+            mark_playlist_stale(playlist.id, in_playlist)
+        if playlist.is_likedSong_playlist:
+            update_liked_song_ids(playlist.user_id, removed=in_playlist)
+
+    results = [
+        {'song_id': song_id, 'status': 'removed' if song_id in in_playlist else 'not_in_playlist'}
+        for song_id in valid_ids
+    ]
+    results.extend({'song_id': song_id, 'status': 'invalid'} for song_id in invalid_ids)
+
+    return JsonResponse({
+        'message': f'{len(in_playlist)} songs removed from {playlist.title}',
+        'playlist_id': str(playlist.id),
+        'removed': len(in_playlist),
+        'results': results
+    }, status=200)
+
+def moveSongInPlaylist(playlist_id, song_id, user, after_song_id=None, before_song_id=None):
+    """
+    Di chuyển bài hát tới sau `after_song_id` hoặc trước `before_song_id`.
+    Chỉ cập nhật position của một dòng (tính rank key nằm giữa hai bài hát kề nhau).
+    """
+    try:
+        playlist = Playlist.objects.get(id=playlist_id)
+    except Playlist.DoesNotExist:
+        return JsonResponse({'message': 'Playlist not found'}, status=404)
+
+    if playlist.user_id != user.id:
+        return JsonResponse({
+            'message': 'You do not have permission to modify this playlist'
+        }, status=403)
+
+    anchor_id = after_song_id or before_song_id
+    rows = {
+        str(row['song_id']): row
+        for row in SongPlaylist.objects.filter(
+            playlist=playlist, song_id__in=[song_id, anchor_id]
+        ).values('id', 'song_id', 'position')
+    }
+    if str(song_id) not in rows or str(anchor_id) not in rows:
+        return JsonResponse({'message': f'Song not found in {playlist.title}'}, status=404)
+    if str(song_id) == str(anchor_id):
+        return JsonResponse({'message': 'Cannot move a song relative to itself'}, status=400)
+
+    moving, anchor = rows[str(song_id)], rows[str(anchor_id)]
+    try:
+        position = _position_next_to(playlist.id, moving, anchor, after=bool(after_song_id))
+    except ValueError:
+        # Hai bài hát kề nhau trùng position (thêm đồng thời) -> đánh lại toàn bộ rồi thử lại
+        position = None
+    if position is None or len(position) > MAX_KEY_LENGTH:
+        # Trùng key, hoặc key dài dần do liên tục chèn vào cùng một chỗ (vd đưa lên đầu)
+        rebalance_playlist_positions(playlist.id)
+        anchor = SongPlaylist.objects.filter(pk=anchor['id']).values('id', 'song_id', 'position').get()
+        position = _position_next_to(playlist.id, moving, anchor, after=bool(after_song_id))
+
+    SongPlaylist.objects.filter(pk=moving['id']).update(position=position)
+    return JsonResponse({
+        'message': 'Song moved successfully',
+        'song_id': str(song_id),
+        'position': position
+    }, status=200)
+
+def _position_next_to(playlist_id, moving, anchor, after=True):
+    others = SongPlaylist.objects.filter(playlist_id=playlist_id).exclude(pk=moving['id'])
+    if after:
+        neighbour = others.filter(
+            Q(position__gt=anchor['position']) | Q(position=anchor['position'], id__gt=anchor['id'])
+        ).order_by('position', 'id').values_list('position', flat=True).first()
+        return rank_between(anchor['position'], neighbour)
+
+    neighbour = others.filter(
+        Q(position__lt=anchor['position']) | Q(position=anchor['position'], id__lt=anchor['id'])
+    ).order_by('-position', '-id').values_list('position', flat=True).first()
+    return rank_between(neighbour, anchor['position'])
+
+def rebalance_playlist_positions(playlist_id):
+    """Gán lại rank key cách đều cho toàn bộ bài hát của playlist (giữ nguyên thứ tự)."""
+    with transaction.atomic():
+        song_playlists = list(
+            SongPlaylist.objects.select_for_update().filter(playlist_id=playlist_id)
+            .order_by('position', 'added_at', 'id').only('id', 'position')
+        )
+        for song_playlist, position in zip(song_playlists, evenly_spaced_ranks(len(song_playlists))):
+            song_playlist.position = position
+        SongPlaylist.objects.bulk_update(song_playlists, ['position'], batch_size=1000)
+    return len(song_playlists)
+
+def getSongFromPlaylist(playlist_id, user_id, is_liked_song=False, cursor=None, limit=TRACKS_PAGE_SIZE, fields=None):
     user = get_user_or_404(user_id)
 
     playlist = get_playlist_or_create_liked_songs(user, playlist_id, is_liked_song)
@@ -79,23 +489,7 @@ def getSongFromPlaylist(playlist_id, user_id, is_liked_song=False):
             'message': 'You do not have permission to view this playlist'
         }, status=403)
 
-    song_playlists = playlist.song_playlists.all()
-    songs = [
-        {
-            'id': str(song_playlist.song.id),
-            'song_name': song_playlist.song.song_name,
-            'singer_name': song_playlist.song.singer_name,
-            'genre': song_playlist.song.genre.name if song_playlist.song.genre else None,
-            'url_audio': song_playlist.song.url_audio,
-            'url_video': song_playlist.song.url_video,
-            'image': song_playlist.song.image
-        }
-        for song_playlist in song_playlists
-    ]
-    return JsonResponse({
-        'message': 'Songs retrieved successfully',
-        'songs': songs
-    }, status=200)
+    return get_tracks_page(playlist.song_playlists.all(), cursor, limit, fields)
 
 def deleteSongFromPlaylist(playlist_id, song_id, user_id, is_liked_song=False):
     user = get_user_or_404(user_id)
@@ -118,14 +512,20 @@ def deleteSongFromPlaylist(playlist_id, song_id, user_id, is_liked_song=False):
 
     try:
         song_playlist = SongPlaylist.objects.get(playlist=playlist, song=song)
-        song_playlist.delete()
+        with transaction.atomic():
+            song_playlist.delete()
+            refresh_song_count(playlist.id)
+            mark_playlist_stale(playlist.id, [song.id])
+        if playlist.is_likedSong_playlist:
+            update_liked_song_ids(playlist.user_id, removed=[song.id])
         return JsonResponse({
             'message': f'Song {song.song_name} removed from {playlist.title}'
         }, status=200)
     except SongPlaylist.DoesNotExist:
         return JsonResponse({'message': f'Song not found in {playlist.title}'}, status=404)
 
-def searchSongFromPlaylist(playlist_id, user_id, query=None, is_liked_song=False):
+def searchSongFromPlaylist(playlist_id, user_id, query=None, is_liked_song=False,
+                           cursor=None, limit=TRACKS_PAGE_SIZE, fields=None):
     user = get_user_or_404(user_id)
     if not user:
         return JsonResponse({'message': 'User not found'}, status=404)
@@ -145,22 +545,7 @@ def searchSongFromPlaylist(playlist_id, user_id, query=None, is_liked_song=False
             Q(song__song_name__icontains=query) | Q(song__singer_name__icontains=query)
         )
 
-    songs = [
-        {
-            'id': str(song_playlist.song.id),
-            'song_name': song_playlist.song.song_name,
-            'singer_name': song_playlist.song.singer_name,
-            'genre': song_playlist.song.genre.name if song_playlist.song.genre else None,
-            'url': song_playlist.song.url,
-            'image': song_playlist.song.image
-        }
-        for song_playlist in song_playlists
-    ]
-
-    return JsonResponse({
-        'message': 'Songs retrieved successfully',
-        'songs': songs
-    }, status=200)
+    return get_tracks_page(song_playlists, cursor, limit, fields)
 
 def goToArtist(request, user_id):
     try:
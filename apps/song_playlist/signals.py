@@ -0,0 +1,34 @@
+from django.db.models import F
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from apps.songs.models import Song
+from apps.songs.recommendations import mark_playlist_stale, mark_playlists_stale
+from .models import SongPlaylist, Playlist
+from .services import forget_liked_song, invalidate_liked_song_ids
+
+# Không có receiver delete nào trên SongPlaylist: để Django xoá cascade bằng một câu DELETE
+# (fast delete) thay vì load từng dòng. Việc xoá lẻ được xử lý trong services.
+
+
+@receiver(post_save, sender=SongPlaylist)
+def song_added_to_playlist(sender, instance, created, **kwargs):
+    if created:
+        Playlist.objects.filter(pk=instance.playlist_id).update(song_count=F('song_count') + 1)
+        mark_playlist_stale(instance.playlist_id)
+
+
+@receiver(pre_delete, sender=Playlist)
+def playlist_deleted(sender, instance, **kwargs):
+    # Chạy trước khi các dòng SongPlaylist bị xoá cascade
+    mark_playlist_stale(instance.id)
+    if instance.is_likedSong_playlist:
+        invalidate_liked_song_ids(instance.user_id)
+
+
+@receiver(pre_delete, sender=Song)
+def song_deleted(sender, instance, **kwargs):
+    # Một UPDATE song_count cho mọi playlist chứa bài hát, một UPDATE đánh dấu neighbors
+    forget_liked_song(instance.id)
+    playlist_ids = SongPlaylist.objects.filter(song_id=instance.id).values('playlist_id')
+    Playlist.objects.filter(pk__in=playlist_ids, song_count__gt=0).update(song_count=F('song_count') - 1)
+    mark_playlists_stale(playlist_ids)
@@ -4,17 +4,33 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from .services import (
     addSongToPlaylist,
+    bulkAddSongsToPlaylist,
+    bulkDeleteSongsFromPlaylist,
+    moveSongInPlaylist,
     goToArtist,
     view_credits,
     getSongFromPlaylist,
     deleteSongFromPlaylist,
     searchSongFromPlaylist,
+    TRACK_FIELDS,
+    TRACKS_PAGE_SIZE,
+    MAX_TRACKS_PAGE_SIZE,
 )
 import json
 
+from ..utils.fields import parse_fields
+from ..utils.pagination import parse_limit
 from ..utils.response import error_response
 
 
+def get_page_params(request):
+    return {
+        'cursor': request.GET.get('cursor') or None,
+        'limit': parse_limit(request.GET.get('limit'), TRACKS_PAGE_SIZE, MAX_TRACKS_PAGE_SIZE),
+        'fields': parse_fields(request.GET, TRACK_FIELDS),
+    }
+
+
 # Add Song to Playlist
 @csrf_exempt
 @api_view(['POST'])
@@ -27,17 +43,84 @@ def add_song_to_playlist(request):
             song_id = data.get("song_id")
 
             if not all([playlist_id, song_id]):
-                return error_response("playlist_id and song_id are required", status_code=400)
+                return error_response("playlist_id and song_id are required", status=400)
 
             user = request.user
             response = addSongToPlaylist(request, playlist_id, song_id, user.id)
             return response
         except json.JSONDecodeError:
-            return error_response("Invalid JSON data", status_code=400)
+            return error_response("Invalid JSON data", status=400)
         except Exception as e:
             print(f"Error in add_song_to_playlist: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
+
+# Bulk Add Songs to Playlist
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_add_songs_to_playlist(request, playlist_id):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            song_ids = data.get("song_ids")
+
+            if not isinstance(song_ids, list) or not song_ids:
+                return error_response("song_ids must be a non-empty list", status=400)
+
+            response = bulkAddSongsToPlaylist(playlist_id, song_ids, request.user)
+            return response
+        except json.JSONDecodeError:
+            return error_response("Invalid JSON data", status=400)
+        except Exception as e:
+            print(f"Error in bulk_add_songs_to_playlist: {str(e)}")
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
+
+# Bulk Delete Songs from Playlist
+@csrf_exempt
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+def bulk_delete_songs_from_playlist(request, playlist_id):
+    if request.method == 'DELETE':
+        try:
+            data = json.loads(request.body)
+            song_ids = data.get("song_ids")
+
+            if not isinstance(song_ids, list) or not song_ids:
+                return error_response("song_ids must be a non-empty list", status=400)
+
+            response = bulkDeleteSongsFromPlaylist(playlist_id, song_ids, request.user)
+            return response
+        except json.JSONDecodeError:
+            return error_response("Invalid JSON data", status=400)
+        except Exception as e:
+            print(f"Error in bulk_delete_songs_from_playlist: {str(e)}")
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
+
+# Move Song in Playlist
+@csrf_exempt
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def move_song_in_playlist(request, playlist_id, song_id):
+    if request.method == 'PUT':
+        try:
+            data = json.loads(request.body)
+            after_song_id = data.get("after_song_id")
+            before_song_id = data.get("before_song_id")
+
+            if bool(after_song_id) == bool(before_song_id):
+                return error_response("Exactly one of after_song_id or before_song_id is required", status=400)
+
+            response = moveSongInPlaylist(playlist_id, song_id, request.user, after_song_id, before_song_id)
+            return response
+        except json.JSONDecodeError:
+            return error_response("Invalid JSON data", status=400)
+        except Exception as e:
+            print(f"Error in move_song_in_playlist: {str(e)}")
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Add to Liked Songs
 @csrf_exempt
@@ -49,17 +132,17 @@ def add_to_liked_songs_view(request):
             data = json.loads(request.body)
             song_id = data.get('song_id')
             if not song_id:
-                return error_response("song_id is required", status_code=400)
+                return error_response("song_id is required", status=400)
 
             user = request.user
             response = addSongToPlaylist(request, None, song_id, user.id, is_liked_song=True)
             return response
         except json.JSONDecodeError:
-            return error_response("Invalid JSON data", status_code=400)
+            return error_response("Invalid JSON data", status=400)
         except Exception as e:
             print(f"Error in add_to_liked_songs_view: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Get Songs from Playlist
 @csrf_exempt
@@ -69,12 +152,12 @@ def getSongsFromPlaylist(request, playlist_id):
     if request.method == 'GET':
         try:
             user = request.user
-            response = getSongFromPlaylist(playlist_id, user.id)
+            response = getSongFromPlaylist(playlist_id, user.id, **get_page_params(request))
             return response
         except Exception as e:
             print(f"Error in getSongsFromPlaylist: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Get Liked Songs
 @csrf_exempt
@@ -84,12 +167,12 @@ def get_liked_songs_view(request):
     if request.method == 'GET':
         try:
             user = request.user
-            response = getSongFromPlaylist(None, user.id, is_liked_song=True)
+            response = getSongFromPlaylist(None, user.id, is_liked_song=True, **get_page_params(request))
             return response
         except Exception as e:
             print(f"Error in get_liked_songs_view: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Search Songs from Playlist
 @csrf_exempt
@@ -100,12 +183,12 @@ def searchSongsFromPlaylist(request, playlist_id):
         try:
             query = request.GET.get('query', None)
             user = request.user
-            response = searchSongFromPlaylist(playlist_id, user.id, query)
+            response = searchSongFromPlaylist(playlist_id, user.id, query, **get_page_params(request))
             return response
         except Exception as e:
             print(f"Error in searchSongsFromPlaylist: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Search Liked Songs
 @csrf_exempt
@@ -116,12 +199,12 @@ def search_liked_songs_view(request):
         try:
             query = request.GET.get('query', None)
             user = request.user
-            response = searchSongFromPlaylist(None, user.id, query, is_liked_song=True)
+            response = searchSongFromPlaylist(None, user.id, query, is_liked_song=True, **get_page_params(request))
             return response
         except Exception as e:
             print(f"Error in search_liked_songs_view: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Delete Song from Playlist
 @csrf_exempt
@@ -135,8 +218,8 @@ def deleteSongFrom_Playlist(request, playlist_id, song_id):
             return response
         except Exception as e:
             print(f"Error in deleteSongFrom_Playlist: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Remove from Liked Songs
 @csrf_exempt
@@ -150,8 +233,8 @@ def remove_from_liked_songs_view(request, song_id):
             return response
         except Exception as e:
             print(f"Error in remove_from_liked_songs_view: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # Go to Artist
 @csrf_exempt
@@ -164,8 +247,8 @@ def go_to_artist(request, artist_id):
             return response
         except Exception as e:
             print(f"Error in go_to_artist: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
 
 # View Credits
 @csrf_exempt
@@ -178,5 +261,5 @@ def view_credits(request, song_id):
             return response
         except Exception as e:
             print(f"Error in view_credits: {str(e)}")
-            return error_response(f"Internal server error: {str(e)}", status_code=500)
-    return error_response("Method not allowed", status_code=405)
\ No newline at end of file
+            return error_response(f"Internal server error: {str(e)}", status=500)
+    return error_response("Method not allowed", status=405)
\ No newline at end of file
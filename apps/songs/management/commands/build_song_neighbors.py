@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.songs.recommendations import build_song_neighbors, TOP_K
+
+class Command(BaseCommand):
+    help = 'Build top-K similar songs from playlist co-occurrence (incremental by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild neighbors for every song')
+        parser.add_argument('--top-k', type=int, default=TOP_K, help='Neighbors stored per song')
+
+    def handle(self, *args, **options):
+        updated = build_song_neighbors(full=options['full'], top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'Updated neighbors for {updated} songs'))
@@ -26,6 +26,13 @@ class Song(models.Model):
     def __str__(self):
         return f"{self.singer_name} - {self.song_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Thể loại lúc load, để signal biết lần save có đổi thể loại không (xem songs/signals.py)
+        instance._loaded_genre_id = dict(zip(field_names, values)).get('genre_id')
+        return instance
+
     def increment_play_count(self):
         """Tăng số lượt nghe"""
         self.play_count += 1
@@ -37,4 +44,23 @@ class Song(models.Model):
             models.Index(fields=['genre']),
             models.Index(fields=['-create_at']),
             models.Index(fields=['-play_count']),  # Thêm index cho play_count
-        ]   
\ No newline at end of file
+            models.Index(fields=['genre', '-play_count']),
+            models.Index(fields=['singer_name', '-play_count']),
+        ]
+
+
+class SongNeighbors(models.Model):
+    """Top-K bài hát tương tự (tính offline từ playlist co-occurrence)"""
+    song = models.OneToOneField(Song, on_delete=models.CASCADE, primary_key=True, related_name='neighbors')
+    neighbor_ids = models.JSONField(default=list)
+    scores = models.JSONField(default=list)
+    is_stale = models.BooleanField(default=False)
+    update_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Neighbors of {self.song_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_stale']),
+        ]
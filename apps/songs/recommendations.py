@@ -0,0 +1,144 @@
+import logging
+import numpy as np
+from scipy import sparse
+from django.db import transaction
+from django.db.models import Q
+from apps.song_playlist.models import SongPlaylist
+from .models import SongNeighbors
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 20
+CHUNK_SIZE = 1000
+
+
+# -------------------------------HELPER FUNCTIONS------------------------------------
+def mark_playlist_stale(playlist_id, song_ids=()):
+    """
+    Đánh dấu cần tính lại neighbors khi playlist thay đổi.
+
+    Thêm/xoá một bài hát làm thay đổi độ tương tự giữa nó và mọi bài hát khác trong
+    playlist, nên toàn bộ bài hát của playlist (và các bài vừa bị xoá) đều bị đánh dấu.
+    """
+    in_playlist = SongPlaylist.objects.filter(playlist_id=playlist_id).values('song_id')
+    SongNeighbors.objects.filter(
+        Q(song_id__in=in_playlist) | Q(song_id__in=list(song_ids))
+    ).update(is_stale=True)
+
+
+def mark_playlists_stale(playlist_ids):
+    """Như mark_playlist_stale cho nhiều playlist (list hoặc queryset playlist_id) trong một query"""
+    SongNeighbors.objects.filter(
+        song_id__in=SongPlaylist.objects.filter(playlist_id__in=playlist_ids).values('song_id')
+    ).update(is_stale=True)
+
+
+def _load_membership_matrix():
+    """Ma trận nhị phân playlist × song (scipy CSC) cùng danh sách song id theo cột."""
+    pairs = SongPlaylist.objects.values_list('playlist_id', 'song_id').iterator(chunk_size=10000)
+
+    playlist_index, song_index = {}, {}
+    rows, cols = [], []
+    for playlist_id, song_id in pairs:
+        rows.append(playlist_index.setdefault(playlist_id, len(playlist_index)))
+        cols.append(song_index.setdefault(song_id, len(song_index)))
+
+    matrix = sparse.csc_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(len(playlist_index), len(song_index))
+    )
+    # Cặp (playlist, song) trùng lặp bị cộng dồn khi tạo ma trận -> đưa về 0/1
+    matrix.data[:] = 1
+    return matrix, list(song_index)
+
+
+def _top_k(column, indices, values, norms, top_k):
+    mask = indices != column
+    indices, values = indices[mask], values[mask]
+    if not len(indices):
+        return [], []
+
+    scores = values / (norms[indices] * norms[column])
+    if len(scores) > top_k:
+        top = np.argpartition(-scores, top_k)[:top_k]
+    else:
+        top = np.arange(len(scores))
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return indices[top], scores[top]
+
+
+# -------------------------------BUILDER------------------------------------
+def build_song_neighbors(full=False, top_k=TOP_K):
+    """
+    Tính cosine similarity giữa các bài hát dựa trên việc cùng nằm trong playlist
+    (kể cả playlist Liked Songs) và lưu top-K neighbors cho mỗi bài hát.
+
+    Args:
+        full: tính lại toàn bộ; mặc định chỉ tính các bài bị đánh dấu stale
+              hoặc chưa có neighbors
+        top_k: số neighbors lưu cho mỗi bài hát
+
+    Returns:
+        int: số bài hát được cập nhật
+    """
+    matrix, song_ids = _load_membership_matrix()
+    column_of = {song_id: column for column, song_id in enumerate(song_ids)}
+
+    if full:
+        targets = set(song_ids)
+        outdated = set(SongNeighbors.objects.values_list('song_id', flat=True)) - targets
+    else:
+        stale = set(SongNeighbors.objects.filter(is_stale=True).values_list('song_id', flat=True))
+        built = set(SongNeighbors.objects.values_list('song_id', flat=True))
+        targets = (stale | (set(song_ids) - built)) & set(column_of)
+        outdated = stale - targets
+
+    # |playlist chứa song| -> chuẩn hoá cosine
+    norms = np.sqrt(np.asarray(matrix.sum(axis=0)).ravel())
+    transposed = matrix.T.tocsr()
+
+    target_columns = sorted(column_of[song_id] for song_id in targets)
+    rows = []
+    for start in range(0, len(target_columns), CHUNK_SIZE):
+        chunk = target_columns[start:start + CHUNK_SIZE]
+        # Co-occurrence của các bài trong chunk với toàn bộ bài hát: (songs × chunk)
+        co_occurrence = (transposed @ matrix[:, chunk]).tocsc()
+        for position, column in enumerate(chunk):
+            begin, end = co_occurrence.indptr[position], co_occurrence.indptr[position + 1]
+            indices, scores = _top_k(
+                column, co_occurrence.indices[begin:end], co_occurrence.data[begin:end], norms, top_k
+            )
+            rows.append(SongNeighbors(
+                song_id=song_ids[column],
+                neighbor_ids=[str(song_ids[index]) for index in indices],
+                scores=[round(float(score), 4) for score in scores],
+                is_stale=False,
+            ))
+
+    # Bài hát không còn nằm trong playlist nào
+    rows.extend(SongNeighbors(song_id=song_id, neighbor_ids=[], scores=[], is_stale=False)
+                for song_id in outdated)
+
+    with transaction.atomic():
+        SongNeighbors.objects.bulk_create(
+            rows,
+            batch_size=CHUNK_SIZE,
+            update_conflicts=True,
+            unique_fields=['song'],
+            update_fields=['neighbor_ids', 'scores', 'is_stale', 'update_at'],
+        )
+
+    logger.info(f"Song neighbors rebuilt for {len(rows)} songs (full={full})")
+    return len(rows)
+
+
+# -------------------------------SERVING------------------------------------
+def get_song_neighbors(song_id, limit=TOP_K):
+    """
+    Returns:
+        list: [(neighbor_id, score), ...] đã sắp xếp giảm dần theo score
+    """
+    neighbors = SongNeighbors.objects.filter(song_id=song_id).values('neighbor_ids', 'scores').first()
+    if not neighbors:
+        return []
+    return list(zip(neighbors['neighbor_ids'], neighbors['scores']))[:limit]
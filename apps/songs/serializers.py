@@ -3,18 +3,21 @@ from rest_framework import serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from apps.song_playlist.services import get_liked_song_ids
+from apps.utils.fields import SparseFieldsMixin
 from .models import Song, Genre
 
-class SongSerializer(serializers.ModelSerializer):
+class SongSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     genre_name = serializers.SerializerMethodField()
     audio_download_url = serializers.SerializerMethodField()
     video_download_url = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Song
         fields = ['id', 'genre', 'genre_name', 'singer_name', 'song_name', 'lyrics',
                  'url_video', 'image', 'url_audio', 'user', 'play_count', 'create_at', 'update_at',
-                 'audio_download_url', 'video_download_url']
+                 'audio_download_url', 'video_download_url', 'is_liked']
         read_only_fields = ['user', 'play_count', 'create_at', 'update_at']
 
     def get_genre_name(self, obj):
@@ -32,6 +35,26 @@ class SongSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(f'/api/songs/{obj.id}/download/video/')
         return None
 
+    def get_is_liked(self, obj):
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return None
+        # Context dùng chung cho cả ListSerializer -> kiểm tra cả trang bằng một lệnh SMISMEMBER
+        checked = self.context.setdefault('checked_song_ids', set())
+        liked = self.context.setdefault('liked_song_ids', set())
+        if str(obj.id) not in checked:
+            song_ids = {str(song_id) for song_id in self._page_song_ids(obj)} | {str(obj.id)}
+            liked |= get_liked_song_ids(request.user.id, song_ids)
+            checked |= song_ids
+        return str(obj.id) in liked
+
+    def _page_song_ids(self, obj):
+        page = getattr(self.parent, 'instance', None)
+        # Manager sẽ tạo queryset mới (thêm một query) -> chỉ dùng list / queryset đã đánh giá
+        if isinstance(page, list) or getattr(page, '_result_cache', None) is not None:
+            return [song.id for song in page]
+        return [obj.id]
+
     @action(detail=True, methods=['get', 'patch'], url_path='lyrics')
     def lyrics(self, request, pk=None):
         song = get_object_or_404(Song, pk=pk)
@@ -55,7 +78,7 @@ class SongSerializer(serializers.ModelSerializer):
             })
         return None
 
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     songs = SongSerializer(many=True, read_only=True)
     song_count = serializers.SerializerMethodField()
     total_plays = serializers.SerializerMethodField()
@@ -70,4 +93,11 @@ class GenreSerializer(serializers.ModelSerializer):
 
     def get_total_plays(self, obj):
         from django.db.models import Sum
-        return obj.songs.aggregate(total=Sum('play_count'))['total'] or 0
\ No newline at end of file
+        return obj.songs.aggregate(total=Sum('play_count'))['total'] or 0
+
+
+# Field mặc định cho từng loại endpoint (?fields= / ?exclude= để thay đổi)
+SONG_FIELDS = SongSerializer.Meta.fields
+SONG_LIST_FIELDS = [name for name in SONG_FIELDS if name != 'lyrics']
+GENRE_FIELDS = GenreSerializer.Meta.fields
+GENRE_LIST_FIELDS = [name for name in GENRE_FIELDS if name != 'songs']
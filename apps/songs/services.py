@@ -0,0 +1,234 @@
+import logging
+import random
+import uuid
+import redis
+from django.core.cache import cache
+from django.db import connections
+from .models import Song
+from .recommendations import get_song_neighbors, TOP_K
+from ..utils.redis_client import get_redis, mark_redis_down
+
+logger = logging.getLogger(__name__)
+
+SONG_CACHE_TIMEOUT = 60 * 5
+SONG_IDS_CACHE_TIMEOUT = 60 * 60
+MAX_BATCH_SIZE = 200
+
+
+# -------------------------------HELPER FUNCTIONS------------------------------------
+def song_cache_key(song_id):
+    return f'song:{song_id}'
+
+
+def parse_song_ids(raw_ids):
+    """
+    Chuẩn hoá danh sách id (chuỗi "a,b,c" hoặc list), giữ thứ tự và bỏ trùng lặp.
+
+    Returns:
+        tuple: (list id hợp lệ, list id không phải UUID)
+    """
+    if isinstance(raw_ids, str):
+        raw_ids = raw_ids.split(',')
+
+    ids, invalid, seen = [], [], set()
+    for raw in raw_ids or []:
+        raw = str(raw).strip()
+        if not raw:
+            continue
+        try:
+            song_id = str(uuid.UUID(raw))
+        except ValueError:
+            invalid.append(raw)
+            continue
+        if song_id not in seen:
+            seen.add(song_id)
+            ids.append(song_id)
+    return ids, invalid
+
+
+def invalidate_song_cache(*song_ids):
+    cache.delete_many([song_cache_key(song_id) for song_id in song_ids])
+
+
+# -------------------------------SONGS------------------------------------
+def get_songs_by_ids(song_ids):
+    """
+    Read-through cache: lấy bài hát từ cache, phần còn thiếu lấy bằng một query id__in.
+
+    Returns:
+        tuple: (list Song theo đúng thứ tự song_ids, list id không tồn tại)
+    """
+    keys = {song_id: song_cache_key(song_id) for song_id in song_ids}
+    cached = cache.get_many(keys.values())
+    found = {song_id: cached[key] for song_id, key in keys.items() if key in cached}
+
+    misses = [song_id for song_id in song_ids if song_id not in found]
+    if misses:
+        fetched = {
+            str(song.id): song
+            for song in Song.objects.select_related('genre').filter(id__in=misses)
+        }
+        if fetched:
+            cache.set_many(
+                {song_cache_key(song_id): song for song_id, song in fetched.items()},
+                timeout=SONG_CACHE_TIMEOUT
+            )
+        found.update(fetched)
+
+    songs = [found[song_id] for song_id in song_ids if song_id in found]
+    missing = [song_id for song_id in song_ids if song_id not in found]
+    return songs, missing
+
+
+def song_queryset(fields=None, queryset=None):
+    """
+    Queryset chỉ đọc những cột cần cho `fields`: bỏ cột lyrics khi không được yêu cầu
+    và chỉ join genre khi cần genre_name.
+    """
+    queryset = Song.objects.all() if queryset is None else queryset
+    if fields is None or 'genre_name' in fields:
+        queryset = queryset.select_related('genre')
+    if fields is not None and 'lyrics' not in fields:
+        queryset = queryset.defer('lyrics')
+    return queryset
+
+
+# -------------------------------RADIO------------------------------------
+RECENT_PLAYS_LIMIT = 50
+RECENT_PLAYS_TIMEOUT = 60 * 60 * 24
+
+
+def recent_plays_cache_key(user_id):
+    return f'recent_plays:{user_id}'
+
+
+def record_recent_play(user_id, song_id):
+    key = recent_plays_cache_key(user_id)
+    recent = [str(song_id)] + [sid for sid in cache.get(key, []) if sid != str(song_id)]
+    cache.set(key, recent[:RECENT_PLAYS_LIMIT], timeout=RECENT_PLAYS_TIMEOUT)
+
+
+def get_recent_plays(user_id):
+    return cache.get(recent_plays_cache_key(user_id), [])
+
+
+def build_radio_queue(seed, size, exclude=()):
+    """
+    Tạo hàng đợi phát tiếp theo từ một bài hát gốc, xen kẽ lần lượt:
+    bài hát tương tự (neighbors), bài phổ biến cùng thể loại và bài cùng ca sĩ.
+
+    Args:
+        seed: Song gốc
+        size: số bài hát trong hàng đợi
+        exclude: id các bài hát cần bỏ qua (lịch sử nghe gần đây, bài đang có trong queue...)
+
+    Returns:
+        list: danh sách Song theo thứ tự phát
+    """
+    neighbors = [song_id for song_id, _ in get_song_neighbors(seed.id, TOP_K)]
+    # Dùng index (genre, -play_count) và (singer_name, -play_count)
+    same_genre = Song.objects.filter(genre_id=seed.genre_id).order_by('-play_count') \
+        .values_list('id', flat=True)[:size * 2]
+    same_singer = Song.objects.filter(singer_name=seed.singer_name).order_by('-play_count') \
+        .values_list('id', flat=True)[:size]
+    sources = [neighbors, [str(sid) for sid in same_genre], [str(sid) for sid in same_singer]]
+
+    seen = {str(seed.id), *map(str, exclude)}
+    queue = []
+    while len(queue) < size and any(sources):
+        for source in sources:
+            while source:
+                song_id = source.pop(0)
+                if song_id not in seen:
+                    seen.add(song_id)
+                    queue.append(song_id)
+                    break
+            if len(queue) >= size:
+                break
+
+    songs, _ = get_songs_by_ids(queue)
+    return songs
+
+
+# -------------------------------SHUFFLE------------------------------------
+SONG_IDS_VERSION_KEY = 'song_ids:version'
+
+
+def song_ids_cache_key(genre_id=None):
+    """Key Redis SET chứa id bài hát (toàn bộ hoặc theo thể loại) của version hiện tại"""
+    version = cache.get(SONG_IDS_VERSION_KEY, 0)
+    return f'song_ids:{version}:{genre_id or "all"}'
+
+
+def invalidate_song_ids_cache():
+    """Đổi version để bỏ toàn bộ tập id đã cache (khi thêm/xoá/đổi thể loại bài hát)"""
+    try:
+        cache.incr(SONG_IDS_VERSION_KEY)
+    except ValueError:
+        cache.set(SONG_IDS_VERSION_KEY, 1, timeout=None)
+
+
+def song_ids_queryset(genre_id=None):
+    queryset = Song.objects.all()
+    if genre_id:
+        queryset = queryset.filter(genre_id=genre_id)
+    return queryset.values_list('id', flat=True)
+
+
+def _load_song_ids(client, key, genre_id=None):
+    song_ids = [str(song_id) for song_id in song_ids_queryset(genre_id)]
+    if song_ids:
+        # MULTI: không ai đọc được tập đang nạp dở
+        pipe = client.pipeline()
+        pipe.delete(key)
+        pipe.sadd(key, *song_ids)
+        pipe.expire(key, SONG_IDS_CACHE_TIMEOUT)
+        pipe.execute()
+    return song_ids
+
+
+def sample_song_ids(size, genre_id=None):
+    """
+    Chọn ngẫu nhiên trên DB khi không có Redis. PostgreSQL: mỗi id là một lần dò index khoá
+    chính từ một UUID ngẫu nhiên (id >= uuid4() ORDER BY id LIMIT 1), gộp bằng UNION trong
+    một query, dò gấp đôi để bù lần trùng / vượt id lớn nhất. Chỉ SQLite (dev, bảng nhỏ)
+    mới dùng ORDER BY RANDOM().
+    """
+    queryset = song_ids_queryset(genre_id)
+    if connections[queryset.db].vendor != 'postgresql':
+        return [str(song_id) for song_id in queryset.order_by('?')[:size]]
+
+    probes = [queryset.filter(id__gte=uuid.uuid4()).order_by('id')[:1] for _ in range(size * 2)]
+    song_ids = list({str(song_id) for song_id in probes[0].union(*probes[1:])})
+    random.shuffle(song_ids)
+    return song_ids[:size]
+
+
+def get_random_song_ids(size, genre_id=None):
+    """
+    `size` id ngẫu nhiên, không trùng: SRANDMEMBER trên tập id trong Redis (chỉ trả về
+    đúng `size` phần tử, không kéo cả danh sách về process). Tập chưa nạp thì nạp từ DB;
+    Redis không dùng được thì chọn trên DB bằng sample_song_ids.
+    """
+    client = get_redis()
+    if client is not None:
+        key = song_ids_cache_key(genre_id)
+        try:
+            song_ids = client.srandmember(key, size)
+            if song_ids:
+                return [song_id.decode() for song_id in song_ids]
+            song_ids = _load_song_ids(client, key, genre_id)
+            return random.sample(song_ids, min(size, len(song_ids)))
+        except redis.RedisError as e:
+            logger.warning(f"Cannot sample song ids from Redis: {e}")
+            mark_redis_down()
+    return sample_song_ids(size, genre_id)
+
+
+def get_random_songs(size, genre_id=None):
+    """
+    Lấy ngẫu nhiên `size` bài hát mà không cần ORDER BY RANDOM() trên toàn bảng:
+    chọn id bằng get_random_song_ids rồi lấy bài hát qua get_songs_by_ids.
+    """
+    songs, _ = get_songs_by_ids(get_random_song_ids(size, genre_id))
+    return songs
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Song, Genre
+from .services import invalidate_song_cache, invalidate_song_ids_cache
+
+
+@receiver(post_save, sender=Song)
+def clear_song_cache(sender, instance, created, **kwargs):
+    invalidate_song_cache(instance.id)
+    # Tập id cho shuffle chỉ đổi khi thêm bài hoặc đổi thể loại, không phải mỗi lần save
+    # (vd. tăng play_count); instance không load từ DB thì không biết thể loại cũ
+    if created or getattr(instance, '_loaded_genre_id', None) != instance.genre_id:
+        invalidate_song_ids_cache()
+    instance._loaded_genre_id = instance.genre_id
+
+
+@receiver(post_delete, sender=Song)
+def clear_deleted_song_cache(sender, instance, **kwargs):
+    invalidate_song_cache(instance.id)
+    invalidate_song_ids_cache()
+
+
+@receiver(post_save, sender=Genre)
+def clear_genre_song_cache(sender, instance, created, **kwargs):
+    # genre_name nằm trong bản cache của từng bài hát
+    if not created:
+        invalidate_song_cache(*instance.songs.values_list('id', flat=True))
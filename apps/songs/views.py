@@ -7,17 +7,28 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, F, Sum, Count, Avg
+from django.db.models import Q, F, Sum, Count, Avg, Prefetch
 from django.utils import timezone
 from datetime import timedelta
 from .models import Song, Genre
-from .serializers import SongSerializer, GenreSerializer
+from .serializers import (
+    SongSerializer, GenreSerializer,
+    SONG_FIELDS, SONG_LIST_FIELDS, GENRE_FIELDS, GENRE_LIST_FIELDS,
+)
 from .form import SongForm
+from .recommendations import get_song_neighbors, TOP_K
+from .services import (
+    get_songs_by_ids, parse_song_ids, invalidate_song_cache, song_queryset, MAX_BATCH_SIZE,
+    build_radio_queue, get_recent_plays, record_recent_play, get_random_songs,
+)
+from apps.utils.fields import parse_fields
+from apps.utils.throttling import IPTokenBucketThrottle, UserTokenBucketThrottle
 import logging
 import urllib.parse
+import uuid
 import requests
 
 logger = logging.getLogger(__name__)
@@ -40,6 +51,21 @@ class GenreViewSet(viewsets.ModelViewSet):
             return [IsAuthenticatedOrReadOnly()]
         return [IsAuthenticated()]
 
+    def get_requested_fields(self):
+        default = GENRE_FIELDS if self.action == 'retrieve' else GENRE_LIST_FIELDS
+        return parse_fields(self.request.query_params, GENRE_FIELDS, default)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == 'GET' and 'songs' in self.get_requested_fields():
+            queryset = queryset.prefetch_related(Prefetch('songs', queryset=song_queryset()))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -61,8 +87,8 @@ class GenreViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='all')
     def all(self, request):
-        queryset = Genre.objects.all().order_by('name')
-        serializer = GenreSerializer(queryset, many=True, context={'request': request})
+        queryset = self.get_queryset().order_by('name')
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='search')
@@ -73,11 +99,11 @@ class GenreViewSet(viewsets.ModelViewSet):
         if query:
             filters &= Q(name__icontains=query)
 
-        queryset = Genre.objects.filter(filters).order_by('name')
+        queryset = self.get_queryset().filter(filters).order_by('name')
 
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(queryset, request)
-        serializer = GenreSerializer(page, many=True, context={'request': request})
+        serializer = self.get_serializer(page, many=True)
         return paginator.get_paginated_response(serializer.data)
 
 
@@ -85,15 +111,20 @@ class SongViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]
     pagination_class = SongPagination
+    throttle_scope = None
 
     def get_queryset(self):
         return Song.objects.all()
 
+    def get_requested_fields(self, request, default=SONG_LIST_FIELDS):
+        return parse_fields(request.query_params, SONG_FIELDS, default)
+
     def list(self, request):
         genre_id = request.query_params.get('genre', None)
         user_id = request.query_params.get('user', None)
 
-        queryset = Song.objects.all()
+        fields = self.get_requested_fields(request)
+        queryset = song_queryset(fields)
 
         if genre_id:
             queryset = queryset.filter(genre_id=genre_id)
@@ -103,12 +134,17 @@ class SongViewSet(viewsets.ViewSet):
 
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(queryset, request)
-        serializer = SongSerializer(page, many=True, context={'request': request})
+        serializer = SongSerializer(page, many=True, context={'request': request}, fields=fields)
         return paginator.get_paginated_response(serializer.data)
 
     def retrieve(self, request, pk=None):
-        song = get_object_or_404(Song, pk=pk)
-        serializer = SongSerializer(song, context={'request': request})
+        song_ids, _ = parse_song_ids([pk])
+        songs, _ = get_songs_by_ids(song_ids)
+        if not songs:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        song = songs[0]
+        fields = self.get_requested_fields(request, default=SONG_FIELDS)
+        serializer = SongSerializer(song, context={'request': request}, fields=fields)
         return Response(serializer.data)
 
     def create(self, request):
@@ -185,13 +221,18 @@ class SongViewSet(viewsets.ViewSet):
             logger.error(f"Error extracting public_id from URL {url}: {e}")
         return None
 
-    @action(detail=True, methods=['post'], url_path='play', permission_classes=[AllowAny])
+    @action(detail=True, methods=['post'], url_path='play', permission_classes=[AllowAny],
+            throttle_classes=[IPTokenBucketThrottle, UserTokenBucketThrottle], throttle_scope='play')
     def play(self, request, pk=None):
         """API để tăng số lượt nghe khi user phát nhạc"""
         song = get_object_or_404(Song, pk=pk)
 
         # Tăng play_count sử dụng F expression để tránh race condition
         Song.objects.filter(pk=pk).update(play_count=F('play_count') + 1)
+        invalidate_song_cache(song.id)
+
+        if request.user.is_authenticated:
+            record_recent_play(request.user.id, song.id)
 
         # Refresh object để lấy giá trị mới
         song.refresh_from_db()
@@ -202,6 +243,124 @@ class SongViewSet(viewsets.ViewSet):
             'song': serializer.data
         })
 
+    @action(detail=False, methods=['get', 'post'], url_path='batch',
+            permission_classes=[AllowAny], parser_classes=[JSONParser, MultiPartParser, FormParser])
+    def batch(self, request):
+        """API lấy nhiều bài hát theo danh sách id (giữ nguyên thứ tự yêu cầu)"""
+        if request.method == 'POST':
+            raw_ids = request.data.get('ids', [])
+        else:
+            raw_ids = request.query_params.get('ids', '')
+
+        if not isinstance(raw_ids, (list, str)):
+            return Response({'error': 'ids must be a list or a comma-separated string'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        song_ids, invalid_ids = parse_song_ids(raw_ids)
+        if len(song_ids) > MAX_BATCH_SIZE:
+            return Response({'error': f'At most {MAX_BATCH_SIZE} ids are allowed per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        songs, missing_ids = get_songs_by_ids(song_ids)
+        fields = self.get_requested_fields(request)
+        serializer = SongSerializer(songs, many=True, context={'request': request}, fields=fields)
+        return Response({
+            'results': serializer.data,
+            'missing': missing_ids + invalid_ids,
+            'total': len(songs)
+        })
+
+    @action(detail=True, methods=['get'], url_path='similar', permission_classes=[AllowAny])
+    def similar(self, request, pk=None):
+        """
+        API lấy các bài hát tương tự (dựa trên các playlist chứa cùng bài hát).
+
+        ?limit= phải là số nguyên dương (400 nếu không phải số), lớn hơn TOP_K thì lấy TOP_K.
+        """
+        # Bài hát gốc lấy qua cache như các bài tương tự; id sai hoặc không tồn tại -> 404
+        song_ids, _ = parse_song_ids([pk])
+        if not song_ids or not get_songs_by_ids(song_ids)[0]:
+            return Response({'error': 'Song not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            limit = int(request.query_params.get('limit', TOP_K))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit <= 0:
+            return Response({'error': 'limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, TOP_K)
+
+        neighbors = get_song_neighbors(song_ids[0], limit)
+        scores = dict(neighbors)
+        songs, _ = get_songs_by_ids([song_id for song_id, _ in neighbors])
+
+        fields = self.get_requested_fields(request)
+        serializer = SongSerializer(songs, many=True, context={'request': request}, fields=fields)
+
+        data = []
+        for song_data, song in zip(serializer.data, songs):
+            song_data['score'] = scores[str(song.id)]
+            data.append(song_data)
+
+        return Response({
+            'results': data,
+            'total': len(data)
+        })
+
+    @action(detail=True, methods=['get'], url_path='radio', permission_classes=[AllowAny])
+    def radio(self, request, pk=None):
+        """API tạo hàng đợi phát tiếp (radio/autoplay) từ một bài hát"""
+        seed = get_object_or_404(Song, pk=pk)
+        size = request.query_params.get('size', 25)
+
+        try:
+            size = int(size)
+            if size <= 0 or size > 100:
+                size = 25
+        except ValueError:
+            size = 25
+
+        # Bỏ qua các bài client đã có trong queue và lịch sử nghe gần đây
+        exclude, _ = parse_song_ids(request.query_params.get('exclude', ''))
+        if request.user.is_authenticated:
+            exclude += get_recent_plays(request.user.id)
+
+        songs = build_radio_queue(seed, size, exclude)
+        fields = self.get_requested_fields(request)
+        serializer = SongSerializer(songs, many=True, context={'request': request}, fields=fields)
+        return Response({
+            'seed': str(seed.id),
+            'results': serializer.data,
+            'total': len(serializer.data)
+        })
+
+    @action(detail=False, methods=['get'], url_path='random', permission_classes=[AllowAny])
+    def shuffle(self, request):
+        """API lấy ngẫu nhiên bài hát (shuffle toàn bộ hoặc theo thể loại)"""
+        size = request.query_params.get('n', 20)
+        genre_id = request.query_params.get('genre', None)
+
+        try:
+            size = int(size)
+            if size <= 0 or size > 100:
+                size = 20
+        except ValueError:
+            size = 20
+
+        if genre_id:
+            try:
+                genre_id = str(uuid.UUID(genre_id))
+            except ValueError:
+                return Response({'error': 'Invalid genre id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        songs = get_random_songs(size, genre_id)
+        fields = self.get_requested_fields(request)
+        serializer = SongSerializer(songs, many=True, context={'request': request}, fields=fields)
+        return Response({
+            'results': serializer.data,
+            'total': len(serializer.data)
+        })
+
     @action(detail=False, methods=['get'], url_path='top-songs')
     def top_songs(self, request):
         """API lấy danh sách bài hát có nhiều lượt nghe nhất"""
@@ -215,7 +374,8 @@ class SongViewSet(viewsets.ViewSet):
         except ValueError:
             limit = 10
 
-        queryset = Song.objects.all()
+        fields = self.get_requested_fields(request)
+        queryset = song_queryset(fields)
 
         # Filter theo genre nếu có
         if genre_id:
@@ -224,7 +384,7 @@ class SongViewSet(viewsets.ViewSet):
         # Sắp xếp theo play_count giảm dần
         queryset = queryset.order_by('-play_count', '-create_at')[:limit]
 
-        serializer = SongSerializer(queryset, many=True, context={'request': request})
+        serializer = SongSerializer(queryset, many=True, context={'request': request}, fields=fields)
 
         # Thêm ranking number
         data = []
@@ -252,11 +412,12 @@ class SongViewSet(viewsets.ViewSet):
         # Lấy những bài hát được tạo trong 30 ngày qua và có play_count cao
         thirty_days_ago = timezone.now() - timedelta(days=30)
 
-        queryset = Song.objects.filter(
+        fields = self.get_requested_fields(request)
+        queryset = song_queryset(fields).filter(
             create_at__gte=thirty_days_ago
         ).order_by('-play_count', '-create_at')[:limit]
 
-        serializer = SongSerializer(queryset, many=True, context={'request': request})
+        serializer = SongSerializer(queryset, many=True, context={'request': request}, fields=fields)
 
         # Thêm ranking
         data = []
@@ -281,12 +442,13 @@ class SongViewSet(viewsets.ViewSet):
         except ValueError:
             limit_per_genre = 5
 
+        fields = self.get_requested_fields(request)
         result = []
         genres = Genre.objects.all()
 
         for genre in genres:
             # Lấy top songs của genre này
-            top_songs = Song.objects.filter(genre=genre).order_by('-play_count')[:limit_per_genre]
+            top_songs = song_queryset(fields).filter(genre=genre).order_by('-play_count')[:limit_per_genre]
 
             if top_songs.exists():  # Chỉ thêm genre có bài hát
                 genre_data = {
@@ -295,7 +457,7 @@ class SongViewSet(viewsets.ViewSet):
                     'songs': []
                 }
 
-                songs_data = SongSerializer(top_songs, many=True, context={'request': request}).data
+                songs_data = SongSerializer(top_songs, many=True, context={'request': request}, fields=fields).data
 
                 # Thêm rank cho mỗi bài hát
                 for index, song in enumerate(songs_data, 1):
@@ -316,8 +478,9 @@ class SongViewSet(viewsets.ViewSet):
         )
 
         # Top 5 bài hát có nhiều lượt nghe nhất
-        top_songs = Song.objects.order_by('-play_count')[:5]
-        top_songs_data = SongSerializer(top_songs, many=True, context={'request': request}).data
+        fields = self.get_requested_fields(request)
+        top_songs = song_queryset(fields).order_by('-play_count')[:5]
+        top_songs_data = SongSerializer(top_songs, many=True, context={'request': request}, fields=fields).data
 
         # Thêm rank
         for index, song in enumerate(top_songs_data, 1):
@@ -419,11 +582,12 @@ class SongViewSet(viewsets.ViewSet):
         except ValueError:
             return Response({'error': 'Limit must be a valid integer'}, status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = Song.objects.all().order_by('-create_at')
+        fields = self.get_requested_fields(request)
+        queryset = song_queryset(fields).order_by('-create_at')
         if limit is not None:
             queryset = queryset[:limit]
 
-        serializer = SongSerializer(queryset, many=True, context={'request': request})
+        serializer = SongSerializer(queryset, many=True, context={'request': request}, fields=fields)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='search')
@@ -433,20 +597,21 @@ class SongViewSet(viewsets.ViewSet):
         """
         try:
             query = request.query_params.get('q', '').strip()
+            fields = self.get_requested_fields(request)
 
             if not query:
                 # Nếu không có query, trả về tất cả bài hát
-                queryset = Song.objects.all().order_by('song_name')
+                queryset = song_queryset(fields).order_by('song_name')
             else:
                 # Tìm kiếm trong tên bài hát và tên ca sĩ
-                queryset = Song.objects.filter(
+                queryset = song_queryset(fields).filter(
                     Q(song_name__icontains=query) | Q(singer_name__icontains=query)
                 ).order_by('song_name', 'singer_name')
 
             # Pagination
             paginator = self.pagination_class()
             page = paginator.paginate_queryset(queryset, request)
-            serializer = SongSerializer(page, many=True, context={'request': request})
+            serializer = SongSerializer(page, many=True, context={'request': request}, fields=fields)
 
             return paginator.get_paginated_response(serializer.data)
 
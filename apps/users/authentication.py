@@ -1,24 +1,199 @@
-# # apps/users/authentication.py
-# from rest_framework_simplejwt.authentication import JWTAuthentication
-# from rest_framework.exceptions import AuthenticationFailed
-# from rest_framework import HTTP_HEADER_ENCODING
-# from Spotify_BE import settings
-#
-# def get_authorization_header(request):
-#     """
-#     Return request's 'Authorization:' header, as a bytestring.
-#
-#     Hide some test client ickyness where the header can be unicode.
-#     """
-#     auth = request.META.get('HTTP_AUTHORIZATION', b'')
-#     if type(auth) == type(''):
-#         # Work around django test client oddness
-#         auth = auth.encode(HTTP_HEADER_ENCODING)
-#     return auth
-#
-# class CustomJWTAuthentication(JWTAuthentication):
-#     def get_validated_token(self, raw_token):
-#         validated_token = super().get_validated_token(raw_token)
-#         # Kiểm tra xem token có được ký bằng SECRET_KEY_JWT không
-#         # Simple JWT tự động kiểm tra chữ ký, nên không cần thêm logic ở đây
-#         return validated_token
+# apps/users/authentication.py
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+import redis
+from channels.db import database_sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import get_authorization_header  # noqa: F401 (dùng bởi utils.helper)
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from apps.utils.redis_client import get_async_redis, mark_redis_down
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TIMEOUT = 5 * 60
+LOCAL_USER_CACHE_SIZE = 1024
+# Bản trong process chỉ được tin trong thời gian ngắn, phòng khi key version trên Redis bị mất
+LOCAL_USER_CACHE_TIMEOUT = 60
+# Chỉ cache các field mà xác thực và UserSerializer cần (không có mật khẩu); các field
+# khác là deferred, truy cập tới sẽ load từ DB
+CACHED_USER_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'phone', 'gender', 'image',
+    'status', 'is_active', 'is_staff', 'is_superuser',
+)
+
+
+class LRUCache:
+    """LRU giới hạn số phần tử, an toàn giữa các thread của một worker"""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_users = LRUCache(LOCAL_USER_CACHE_SIZE, LOCAL_USER_CACHE_TIMEOUT)
+
+
+def user_version_key(user_id):
+    return f'auth_user:version:{user_id}'
+
+
+def user_cache_key(user_id, version):
+    return f'auth_user:fields:{user_id}:{version}'
+
+
+def invalidate_cached_user(*user_ids):
+    """Tăng version -> mọi bản cache (Redis và LRU của các worker) của user đều hết hiệu lực"""
+    for user_id in user_ids:
+        key = user_version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def build_cached_user(fields):
+    """User (các field ngoài CACHED_USER_FIELDS là deferred) từ dict đã cache"""
+    # from_db nhận giá trị theo thứ tự các field của model
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in fields]
+    return User.from_db(User.objects.db, names, [fields[name] for name in names])
+
+
+def get_cached_user(user_id):
+    """
+    User theo id: LRU trong process -> Redis -> DB.
+
+    Mỗi request chỉ tốn một lần GET version trên Redis; trả về bản copy để view có
+    thể sửa/lưu user mà không ảnh hưởng tới bản trong cache. User không tồn tại cũng
+    được cache (False) để id sai không chạm DB mỗi lần; tạo user sẽ tăng version.
+
+    Returns:
+        User hoặc None nếu không tồn tại
+    """
+    version = cache.get(user_version_key(user_id), 0)
+    key = user_cache_key(user_id, version)
+
+    user = _local_users.get(key)
+    if user is None:
+        fields = cache.get(key)
+        if fields is None:
+            fields = User.objects.filter(pk=user_id).values(*CACHED_USER_FIELDS).first() or False
+            cache.set(key, fields, timeout=USER_CACHE_TIMEOUT)
+        user = build_cached_user(fields) if fields else False
+        _local_users.set(key, user)
+    return copy.copy(user) if user else None
+
+
+async def aget_user_version(user_id):
+    """
+    Version của user đọc bằng client Redis asyncio. RedisCache của Django 4.2 không có
+    aget thật (chỉ bọc get bằng sync_to_async), tức mỗi lần đọc là một lần chuyển thread.
+    """
+    client = get_async_redis()
+    if client is None:
+        return await cache.aget(user_version_key(user_id), 0)
+    try:
+        # RedisCache lưu số nguyên dạng chuỗi (không pickle) dưới key đã thêm prefix
+        version = await client.get(cache.make_key(user_version_key(user_id)))
+    except redis.RedisError:
+        logger.warning('Redis unavailable, reading user version through the cache', exc_info=True)
+        mark_redis_down()
+        return await cache.aget(user_version_key(user_id), 0)
+    return int(version) if version is not None else 0
+
+
+async def aget_cached_user(user_id):
+    """
+    Bản async của get_cached_user cho consumer / ASGI middleware: chỉ chuyển sang thread
+    (và có thể chạm DB) khi LRU trong process không có bản của version hiện tại.
+    """
+    version = await aget_user_version(user_id)
+    user = _local_users.get(user_cache_key(user_id, version))
+    if user is not None:
+        return copy.copy(user) if user else None
+    return await database_sync_to_async(get_cached_user)(user_id)
+
+
+def get_token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+
+def check_token_user(user, validated_token):
+    """Các kiểm tra của JWTAuthentication.get_user sau khi đã có user"""
+    if user is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication lấy user qua get_cached_user thay vì query DB mỗi request"""
+
+    def get_user(self, validated_token):
+        user_id = get_token_user_id(validated_token)
+        try:
+            user = get_cached_user(user_id)
+        except (ValueError, TypeError, ValidationError):
+            user = None
+        check_token_user(user, validated_token)
+        return user
+
+    async def aauthenticate_token(self, raw_token):
+        """
+        Xác thực access token cho WebSocket: chữ ký / hạn dùng kiểm tra trong process
+        (AccessToken không cần DB), user lấy qua aget_cached_user.
+
+        Raises:
+            AuthenticationFailed: token không hợp lệ hoặc user không dùng được
+        """
+        validated_token = self.get_validated_token(raw_token)
+        user_id = get_token_user_id(validated_token)
+        try:
+            user = await aget_cached_user(user_id)
+        except (ValueError, TypeError, ValidationError):
+            user = None
+        check_token_user(user, validated_token)
+        return user
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import redis
+from django.utils import timezone
+from apps.utils.redis_client import get_redis, mark_redis_down
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Bloom filter (bitmap trên Redis) chứa mọi username và email đã dùng.
+# 2^24 bit (2MB) với 7 hàm hash: ~1% dương tính giả ở 1,7 triệu phần tử.
+BLOOM_KEY = 'users:bloom'
+BLOOM_READY_KEY = 'users:bloom:ready'
+BLOOM_BITS = 2 ** 24
+BLOOM_HASHES = 7
+REBUILD_CHUNK_SIZE = 5000
+
+
+def _username_item(username):
+    return f'u:{username}'
+
+
+def _email_item(email):
+    # Email so sánh không phân biệt hoa thường (khớp với lookup iexact bên dưới)
+    return f'e:{email.strip().lower()}'
+
+
+def _bit_offsets(item):
+    # Double hashing: h1 + i*h2 thay cho k hàm hash độc lập
+    digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:], 'big') | 1
+    return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+
+def _user_items(username, email):
+    items = []
+    if username:
+        items.append(_username_item(username))
+    if email:
+        items.append(_email_item(email))
+    return items
+
+
+def add_to_filter(username=None, email=None):
+    client = get_redis()
+    items = _user_items(username, email)
+    if client is None or not items:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for item in items:
+            for offset in _bit_offsets(item):
+                pipe.setbit(BLOOM_KEY, offset, 1)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Cannot update user availability filter: {e}")
+        mark_redis_down()
+
+
+def _might_exist(items):
+    """
+    Returns:
+        dict: item -> False nếu chắc chắn chưa dùng, True nếu có thể đã dùng
+              (hoặc filter chưa sẵn sàng)
+    """
+    client = get_redis()
+    if client is None:
+        return {item: True for item in items}
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.exists(BLOOM_READY_KEY)
+        for item in items:
+            for offset in _bit_offsets(item):
+                pipe.getbit(BLOOM_KEY, offset)
+        ready, *bits = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Cannot read user availability filter: {e}")
+        mark_redis_down()
+        return {item: True for item in items}
+
+    if not ready:
+        return {item: True for item in items}
+    return {
+        item: all(bits[index * BLOOM_HASHES:(index + 1) * BLOOM_HASHES])
+        for index, item in enumerate(items)
+    }
+
+
+def check_availability(username=None, email=None):
+    """
+    Returns:
+        dict: {'username': bool, 'email': bool} cho các giá trị được truyền vào
+    """
+    items = {}
+    if username:
+        items['username'] = _username_item(username)
+    if email:
+        items['email'] = _email_item(email)
+
+    might_exist = _might_exist(list(items.values()))
+    result = {}
+    if username:
+        # Chỉ khi filter báo "có thể đã dùng" mới query (username có unique index)
+        result['username'] = not (
+            might_exist[items['username']] and User.objects.filter(username=username).exists()
+        )
+    if email:
+        result['email'] = not (
+            might_exist[items['email']] and User.objects.filter(email__iexact=email.strip()).exists()
+        )
+    return result
+
+
+def rebuild_filter(chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Dựng lại filter từ bảng User vào key tạm rồi RENAME để thay thế nguyên tử.
+
+    Returns:
+        int: số user đã nạp
+    """
+    client = get_redis()
+    if client is None:
+        raise RuntimeError('REDIS_URL is not configured or Redis is unavailable')
+
+    started = timezone.now()
+    bits = bytearray(BLOOM_BITS // 8)
+    count = 0
+    for username, email in User.objects.values_list('username', 'email').iterator(chunk_size=chunk_size):
+        for item in _user_items(username, email):
+            for offset in _bit_offsets(item):
+                # Bit 0 của Redis là bit cao nhất của byte đầu tiên
+                bits[offset >> 3] |= 0x80 >> (offset & 7)
+        count += 1
+
+    temporary_key = f'{BLOOM_KEY}:rebuild'
+    client.set(temporary_key, bytes(bits))
+    client.rename(temporary_key, BLOOM_KEY)
+    client.set(BLOOM_READY_KEY, 1)
+
+    # User tạo trong lúc dựng lại được signal ghi vào key cũ -> ghi lại vào key mới
+    for username, email in User.objects.filter(date_joined__gte=started).values_list('username', 'email'):
+        add_to_filter(username, email)
+    return count
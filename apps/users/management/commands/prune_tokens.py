@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+from apps.users.tokens import seed_revoked_tokens
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding/blacklisted JWTs in batches and reseed the Redis revocation set'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = aware_utcnow()
+        pruned = 0
+
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by().values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # DELETE trực tiếp theo batch, không qua collector (mỗi dòng một object)
+            placeholders = ', '.join(['%s'] * len(ids))
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(BlacklistedToken._meta.db_table)} '
+                    f'WHERE token_id IN ({placeholders})', ids
+                )
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(OutstandingToken._meta.db_table)} '
+                    f'WHERE id IN ({placeholders})', ids
+                )
+            pruned += len(ids)
+
+        seeded = seed_revoked_tokens(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {pruned} expired tokens, {seeded} revoked tokens cached'
+        ))
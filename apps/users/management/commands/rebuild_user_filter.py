@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.users.availability import rebuild_filter
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis Bloom filter of used usernames/emails from the User table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            count = rebuild_filter(options['chunk_size'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Availability filter rebuilt from {count} users'))
@@ -0,0 +1,9 @@
+import json
+from django.core.management.base import BaseCommand
+from apps.utils.throttling import get_throttle_stats
+
+class Command(BaseCommand):
+    help = 'Print allowed/rejected request counters of the token bucket throttles'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(get_throttle_stats(), indent=2, sort_keys=True))
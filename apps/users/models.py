@@ -1,7 +1,25 @@
-from django.contrib.auth.models import AbstractUser, Group, Permission
+from django.contrib.auth.models import AbstractUser, Group, Permission, UserManager
 from django.db import models
+from django.db.models.functions import Upper
 import uuid
 
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # QuerySet.update không gửi post_save: tự làm mất hiệu lực cache user (khoá tài
+        # khoản, đổi mật khẩu hàng loạt...) nếu đổi field mà bản cache dùng tới
+        from .authentication import CACHED_USER_FIELDS, invalidate_cached_user
+        user_ids = []
+        if kwargs.keys() & {'password', *CACHED_USER_FIELDS}:
+            user_ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        invalidate_cached_user(*user_ids)
+        return rows
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     phone = models.CharField(max_length=10, blank=True, null=True, unique=True)
@@ -11,5 +29,13 @@ class User(AbstractUser):
     groups = models.ManyToManyField(Group, related_name='custom_user_set')
     user_permissions = models.ManyToManyField(Permission, related_name='custom_user_set')
 
+    objects = CustomUserManager()
+
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+    class Meta:
+        indexes = [
+            # Lookup email không phân biệt hoa thường (email__iexact -> UPPER(email))
+            models.Index(Upper('email'), name='users_user_email_upper_idx'),
+        ]
\ No newline at end of file
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from rest_framework_simplejwt.tokens import Token
+
+ADMIN_GROUPS = {'admin', 'full_role'}
+USER_GROUPS_CACHE_TIMEOUT = 60
+
+
+def user_groups_cache_key(user_id):
+    return f'user_groups:{user_id}'
+
+
+def invalidate_user_groups(*user_ids):
+    cache.delete_many([user_groups_cache_key(user_id) for user_id in user_ids])
+
+
+def load_user_groups(user):
+    """Đọc group của user từ DB và ghi lại vào cache"""
+    groups = list(user.groups.values_list('name', flat=True))
+    cache.set(user_groups_cache_key(user.id), groups, timeout=USER_GROUPS_CACHE_TIMEOUT)
+    return groups
+
+
+def _token_claims(user, request):
+    # Chỉ dùng claim của JWT đã được xác thực và thuộc về chính user này
+    token = getattr(request, 'auth', None) if request is not None else None
+    if isinstance(token, Token) and str(token.get('user_id')) == str(user.id) and 'groups' in token:
+        return token
+    return None
+
+
+def get_user_groups(user, request=None):
+    """
+    Tên các group của user.
+
+    Ưu tiên claim `groups` trong JWT của request (CustomTokenObtainPairSerializer),
+    sau đó là cache theo user (USER_GROUPS_CACHE_TIMEOUT) cho Session/Token auth.
+    """
+    claims = _token_claims(user, request)
+    if claims is not None:
+        return list(claims['groups'])
+
+    groups = cache.get(user_groups_cache_key(user.id))
+    if groups is None:
+        groups = load_user_groups(user)
+    return groups
+
+
+def get_role(user, request=None):
+    claims = _token_claims(user, request)
+    if claims is not None and 'role' in claims:
+        return claims['role']
+    if user.is_superuser or 'admin' in get_user_groups(user, request):
+        return 'admin'
+    return 'user'
+
+
+def has_admin_role(user, request=None):
+    """User thuộc group admin/full_role (quyền quản lý playlist của người khác)"""
+    if not user or not user.is_authenticated:
+        return False
+    return bool(ADMIN_GROUPS & set(get_user_groups(user, request)))
@@ -1,8 +1,14 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer, TokenRefreshSerializer, TokenVerifySerializer, TokenBlacklistSerializer
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
 from django.contrib.auth.models import Group
 from .models import User
+from .permissions import get_role, load_user_groups
+from .tokens import CachedRefreshToken, is_revoked
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
@@ -11,18 +17,29 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
         # Add custom claims
         token['user_id'] = str(user.id)
-        # Get user groups (roles)
-        token['groups'] = list(user.groups.values_list('name', flat=True))
+        # Get user groups (roles), đồng thời làm mới cache group của user
+        token['groups'] = load_user_groups(user)
         # Add role based on groups or superuser status
-        if user.is_superuser:
-            token['role'] = 'admin'
-        elif user.groups.filter(name='admin').exists():
+        if user.is_superuser or 'admin' in token['groups']:
             token['role'] = 'admin'
         else:
             token['role'] = 'user'
 
         return token
 
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedRefreshToken
+
+class CachedTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = CachedRefreshToken
+
+class CachedTokenVerifySerializer(TokenVerifySerializer):
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if api_settings.BLACKLIST_AFTER_ROTATION and is_revoked(token.get(api_settings.JTI_CLAIM)):
+            raise serializers.ValidationError("Token is blacklisted")
+        return {}
+
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
@@ -64,11 +81,8 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'phone', 'gender', 'image', 'status', 'role')
 
     def get_role(self, obj):
-        if obj.is_superuser:
-            return 'admin'
-        elif obj.groups.filter(name='admin').exists():
-            return 'admin'
-        return 'user'
+        # Chỉ dùng cho một user (đăng nhập); danh sách user dựng role từ users.services.user_rows
+        return get_role(obj, self.context.get('request'))
 
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField(required=True)
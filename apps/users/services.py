@@ -1,8 +1,30 @@
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.db.models import Q
+from apps.utils.search import search_queryset
+from django.db.models import Exists, OuterRef
 from .models import User
 from django.contrib.auth.hashers import make_password
 
+USER_LIST_FIELDS = ['id', 'username', 'email', 'phone', 'gender', 'image', 'status']
+
+# ------------------------ HELPER FUNCTION --------------------------
+def with_admin_role(queryset):
+    """Annotate `is_admin_role` bằng một subquery EXISTS thay vì query group từng user"""
+    admin_membership = User.groups.through.objects.filter(user_id=OuterRef('pk'), group__name='admin')
+    return queryset.annotate(is_admin_role=Exists(admin_membership))
+
+
+def user_rows(queryset):
+    # Chỉ lấy các cột cần cho danh sách user (không dựng model instance)
+    return with_admin_role(queryset).values(*USER_LIST_FIELDS, 'is_superuser', 'is_admin_role')
+
+
+def get_user_row_data(row):
+    data = {field: row[field] for field in USER_LIST_FIELDS}
+    data['id'] = str(row['id'])
+    data['role'] = 'admin' if row['is_superuser'] or row['is_admin_role'] else 'user'
+    return data
+
+# -----------------------------HANDLE ---------------------------------
 def create_user_service(data):
     try:
         # Validate required fields
@@ -42,7 +64,7 @@ def create_user_service(data):
 
 def get_users_service(page=1, page_size=10):
     try:
-        users = User.objects.all().order_by('id')
+        users = user_rows(User.objects.all().order_by('id'))
         paginator = Paginator(users, page_size)
         try:
             paginated_users = paginator.page(page)
@@ -51,18 +73,7 @@ def get_users_service(page=1, page_size=10):
         except EmptyPage:
             paginated_users = paginator.page(paginator.num_pages)
 
-        users_data = [
-            {
-                'id': str(user.id),
-                'username': user.username,
-                'email': user.email,
-                'phone': user.phone,
-                'gender': user.gender,
-                'image': user.image,
-                'status': user.status,
-            }
-            for user in paginated_users
-        ]
+        users_data = [get_user_row_data(row) for row in paginated_users]
 
         return {
             'users': users_data,
@@ -113,11 +124,7 @@ def delete_user_service(user_id):
 
 def search_users_service(query, page=1, page_size=10):
     try:
-        print(f"Search Query: '{query}'")  # Add for debugging
-        users = User.objects.filter(
-            Q(username__icontains=query) | Q(email__icontains=query)
-        ).order_by('id')
-        print(f"Found {users.count()} users")  # Add for debugging
+        users = user_rows(search_queryset(User.objects.all(), query, ['username', 'email']))
         paginator = Paginator(users, page_size)
         try:
             paginated_users = paginator.page(page)
@@ -125,18 +132,7 @@ def search_users_service(query, page=1, page_size=10):
             paginated_users = paginator.page(1)
         except EmptyPage:
             paginated_users = paginator.page(paginator.num_pages)
-        users_data = [
-            {
-                'id': str(user.id),
-                'username': user.username,
-                'email': user.email,
-                'phone': user.phone,
-                'gender': user.gender,
-                'image': user.image,
-                'status': user.status,
-            }
-            for user in paginated_users
-        ]
+        users_data = [get_user_row_data(row) for row in paginated_users]
         return {
             'users': users_data,
             'page': page,
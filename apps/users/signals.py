@@ -0,0 +1,37 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from .authentication import invalidate_cached_user
+from .availability import add_to_filter
+from .models import User
+from .permissions import invalidate_user_groups
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def clear_user_groups_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_user_groups(instance.pk)
+    elif pk_set:
+        # group.custom_user_set.add(...) -> pk_set là id của user
+        invalidate_user_groups(*pk_set)
+    elif action == 'pre_clear':
+        invalidate_user_groups(*instance.custom_user_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=User)
+def clear_deleted_user_groups(sender, instance, **kwargs):
+    invalidate_user_groups(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def clear_cached_user(sender, instance, **kwargs):
+    # update_user_service, ban (status), đổi mật khẩu, xoá user
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def add_user_to_availability_filter(sender, instance, **kwargs):
+    # Bloom filter không xoá được phần tử: username/email cũ chỉ gây dương tính giả
+    add_to_filter(instance.username, instance.email)
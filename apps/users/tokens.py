@@ -0,0 +1,98 @@
+import time
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+# Tập JTI bị thu hồi trên Redis, mỗi key hết hạn cùng lúc với token.
+# Chỉ tin vào tập này khi đã được nạp đầy đủ từ DB (marker REVOKED_SEEDED_KEY). Thiếu
+# marker (Redis khởi động lại, marker hết hạn) thì request đầu tiên nạp lại tập,
+# trong lúc đang nạp các request khác kiểm tra bảng BlacklistedToken.
+REVOKED_SEEDED_KEY = 'revoked_jti:seeded'
+REVOKED_SEEDING_KEY = 'revoked_jti:seeding'
+# Marker có hạn: key JTI có thể bị Redis evict trong khi marker còn, nên mỗi ngày nạp lại
+REVOKED_SEEDED_TIMEOUT = 24 * 60 * 60
+# Khoá nạp tự hết hạn nếu process đang nạp bị dừng giữa chừng
+REVOKED_SEEDING_TIMEOUT = 60
+SEED_BATCH_SIZE = 1000
+
+
+def revoked_jti_key(jti):
+    return f'revoked_jti:{jti}'
+
+
+def remember_revoked(jti, exp):
+    timeout = max(int(exp - time.time()), 1)
+    cache.set(revoked_jti_key(jti), True, timeout=timeout)
+
+
+def is_revoked(jti):
+    key = revoked_jti_key(jti)
+    values = cache.get_many([REVOKED_SEEDED_KEY, key])
+    if key in values:
+        return True
+    if REVOKED_SEEDED_KEY in values:
+        return False
+
+    # Chỉ một process nạp lại tập, cache.add đặt khoá nếu chưa có
+    if cache.add(REVOKED_SEEDING_KEY, True, timeout=REVOKED_SEEDING_TIMEOUT):
+        try:
+            seed_revoked_tokens()
+        finally:
+            cache.delete(REVOKED_SEEDING_KEY)
+        return cache.get(key) is not None
+
+    revoked = BlacklistedToken.objects.filter(token__jti=jti).values_list('token__expires_at', flat=True).first()
+    if revoked is None:
+        return False
+    remember_revoked(jti, revoked.timestamp())
+    return True
+
+
+def seed_revoked_tokens(batch_size=SEED_BATCH_SIZE):
+    """
+    Nạp toàn bộ JTI còn hạn trong BlacklistedToken vào Redis rồi đặt marker.
+
+    Returns:
+        int: số JTI đã nạp
+    """
+    now = aware_utcnow()
+    revoked = BlacklistedToken.objects.filter(token__expires_at__gt=now) \
+        .values_list('token__jti', 'token__expires_at').iterator(chunk_size=batch_size)
+
+    seeded = 0
+    batch = []
+    for jti, expires_at in revoked:
+        batch.append((jti, expires_at))
+        if len(batch) >= batch_size:
+            seeded += _seed_batch(batch, now)
+            batch = []
+    seeded += _seed_batch(batch, now)
+
+    cache.set(REVOKED_SEEDED_KEY, True, timeout=REVOKED_SEEDED_TIMEOUT)
+    return seeded
+
+
+def _seed_batch(batch, now):
+    if not batch:
+        return 0
+    # set_many chỉ nhận một timeout -> dùng hạn xa nhất trong batch
+    timeout = max(int((expires_at - now).total_seconds()) for _, expires_at in batch) + 1
+    cache.set_many({revoked_jti_key(jti): True for jti, _ in batch}, timeout=timeout)
+    return len(batch)
+
+
+class CachedRefreshToken(RefreshToken):
+    """RefreshToken kiểm tra blacklist qua tập JTI trên Redis thay vì query DB"""
+
+    def check_blacklist(self):
+        if is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        remember_revoked(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+        return result
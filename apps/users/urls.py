@@ -1,9 +1,10 @@
 # apps/users/urls.py
 from django.urls import path
-from .views import RegisterView, LoginView, SocialLoginView
+from .views import RegisterView, LoginView, SocialLoginView, AvailabilityView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('social-login/', SocialLoginView.as_view(), name='social-login'),
+    path('availability/', AvailabilityView.as_view(), name='availability'),
 ]
\ No newline at end of file
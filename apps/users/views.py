@@ -24,7 +24,10 @@ from .services import (
 from Spotify_BE import settings
 from .serializers import RegisterSerializer, UserSerializer, LoginSerializer, SocialLoginSerializer, CustomTokenObtainPairSerializer
 from .models import User
+from .permissions import get_role
+from .availability import check_availability
 from apps.utils.response import success_response, error_response
+from apps.utils.throttling import IPTokenBucketThrottle, UsernameTokenBucketThrottle
 from django.contrib.auth.models import Group
 
 # Set up logging
@@ -50,6 +53,9 @@ class RegisterView(generics.CreateAPIView):
 class LoginView(generics.GenericAPIView):
     serializer_class = LoginSerializer
     permission_classes = [AllowAny]
+    # Chặn trước khi tới bước hash mật khẩu: theo IP và theo tài khoản bị thử
+    throttle_classes = [IPTokenBucketThrottle, UsernameTokenBucketThrottle]
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -74,6 +80,8 @@ class LoginView(generics.GenericAPIView):
 class SocialLoginView(generics.GenericAPIView):
     serializer_class = SocialLoginSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scope = 'social_login'
 
     TOKEN_URL = "https://oauth2.googleapis.com/token"
     USER_INFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
@@ -203,6 +211,22 @@ class SocialLoginView(generics.GenericAPIView):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
+class AvailabilityView(generics.GenericAPIView):
+    """Kiểm tra username/email đã được dùng chưa (Bloom filter, chỉ query DB khi có thể trùng)"""
+    permission_classes = [AllowAny]
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scope = 'availability'
+
+    def get(self, request, *args, **kwargs):
+        username = request.query_params.get('username', '').strip()
+        email = request.query_params.get('email', '').strip()
+        if not username and not email:
+            return Response(
+                {'detail': 'username or email is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(check_availability(username or None, email or None))
+
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -221,7 +245,7 @@ def create_user(request):
                 'gender': user.gender,
                 'image': user.image,
                 'status': user.status,
-                'role': 'admin' if user.groups.filter(name='admin').exists() or user.is_superuser else 'user'
+                'role': get_role(user, request)
             }
 
             return success_response("Create user success", user_data)
@@ -230,7 +254,7 @@ def create_user(request):
         except Exception as e:
             print(f"Error in create_user view: {str(e)}")
             return error_response(f"Failed to create user: {str(e)}")
-    return error_response("Method not allowed", status_code=405)
+    return error_response("Method not allowed", status=405)
 
 @csrf_exempt
 @api_view(['GET'])
@@ -247,15 +271,10 @@ def get_users(request):
                 return error_response("Invalid page or page_size")
 
             result = get_users_service(page, page_size)
-            # Cập nhật kết quả để thêm role
-            for user_data in result.get('data', []):
-                user = User.objects.get(id=user_data['id'])
-                user_data['role'] = 'admin' if user.groups.filter(name='admin').exists() or user.is_superuser else 'user'
-
             return success_response("Get list success", result)
         except Exception as e:
             return error_response(str(e))
-    return error_response("Method not allowed", status_code=405)
+    return error_response("Method not allowed", status=405)
 
 @csrf_exempt
 @api_view(['GET'])
@@ -274,12 +293,12 @@ def get_user(request, user_id):
                 'gender': user.gender,
                 'image': user.image,
                 'status': user.status,
-                'role': 'admin' if user.groups.filter(name='admin').exists() or user.is_superuser else 'user'
+                'role': get_role(user, request)
             }
             return success_response("Get user success", user_data)
         except Exception as e:
             return error_response(str(e))
-    return error_response("Method not allowed", status_code=405)
+    return error_response("Method not allowed", status=405)
 
 @csrf_exempt
 @api_view(['PUT'])
@@ -299,14 +318,14 @@ def update_user(request, user_id):
                 'gender': user.gender,
                 'image': user.image,
                 'status': user.status,
-                'role': 'admin' if user.groups.filter(name='admin').exists() or user.is_superuser else 'user'
+                'role': get_role(user, request)
             }
             return success_response("Update user success", user_data)
         except json.JSONDecodeError:
             return error_response("Invalid JSON data")
         except Exception as e:
             return error_response(str(e))
-    return error_response("Method not allowed", status_code=405)
+    return error_response("Method not allowed", status=405)
 
 @csrf_exempt
 @api_view(['DELETE'])
@@ -325,12 +344,12 @@ def delete_user(request, user_id):
                 'gender': user.gender,
                 'image': user.image,
                 'status': user.status,
-                'role': 'admin' if user.groups.filter(name='admin').exists() or user.is_superuser else 'user'
+                'role': get_role(user, request)
             }
             return success_response("Delete user success", user_data)
         except Exception as e:
             return error_response(str(e))
-    return error_response("Method not allowed", status_code=405)
+    return error_response("Method not allowed", status=405)
 
 @csrf_exempt
 @api_view(['GET'])
@@ -348,12 +367,7 @@ def search_users(request):
                 return error_response("Invalid page or page_size")
 
             result = search_users_service(query, page, page_size)
-            # Cập nhật kết quả để thêm role
-            for user_data in result.get('data', []):
-                user = User.objects.get(id=user_data['id'])
-                user_data['role'] = 'admin' if user.groups.filter(name='admin').exists() or user.is_superuser else 'user'
-
             return success_response("Search users success", result)
         except Exception as e:
             return error_response(str(e))
-    return error_response("Method not allowed", status_code=405)
\ No newline at end of file
+    return error_response("Method not allowed", status=405)
\ No newline at end of file
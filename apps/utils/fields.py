@@ -0,0 +1,53 @@
+# ------------------------------------- CHỌN FIELD TRẢ VỀ --------------------------------------
+def parse_fields(params, available, default=None):
+    """
+    Chuyển `?fields=a,b` / `?exclude=c` thành danh sách field cần trả về.
+
+    Args:
+        params: request.GET / request.query_params
+        available: mọi field endpoint trả được (quyết định thứ tự trong kết quả)
+        default: các field trả về khi không có `?fields=` (mặc định là tất cả)
+
+    Returns:
+        list: tên các field được yêu cầu, tên không tồn tại bị bỏ qua
+    """
+    available = list(available)
+    requested = _split(params.get('fields'))
+    if requested:
+        fields = [name for name in available if name in requested]
+    else:
+        fields = list(default) if default is not None else available
+
+    excluded = _split(params.get('exclude'))
+    if excluded:
+        fields = [name for name in fields if name not in excluded]
+    return fields
+
+
+def project(data, fields):
+    """Chỉ giữ các key trong `fields` của payload dict (None -> giữ nguyên)"""
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key in fields}
+
+
+def _split(value):
+    if not value:
+        return set()
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Mixin cho serializer: nhận kwarg `fields` và bỏ mọi field khác.
+
+        SongSerializer(queryset, many=True, fields=['id', 'song_name'])
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
@@ -1,7 +1,7 @@
 import jwt
 from django.http import JsonResponse
 from django.conf import settings
-from ..users.models import User
+from ..users.authentication import get_cached_user
 
 def decode_jwt_token(token):
     if not token:
@@ -19,10 +19,9 @@ def decode_jwt_token(token):
                 {"status": "error", "message": "Invalid token payload"}, status=400
             )
 
-        # Lấy user từ database
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
+        # Lấy user qua cache (LRU -> Redis -> DB)
+        user = get_cached_user(user_id)
+        if user is None:
             return None, None, JsonResponse(
                 {"status": "error", "message": "User not found"}, status=404
             )
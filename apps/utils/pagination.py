@@ -0,0 +1,37 @@
+import base64
+import json
+
+# ------------------------------------- PHÂN TRANG THEO CURSOR --------------------------------------
+def encode_cursor(*values):
+    """Mã hoá khoá sắp xếp của dòng cuối trang thành chuỗi cursor (client không cần hiểu)"""
+    raw = json.dumps([str(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """
+    Giải mã cursor tạo bởi encode_cursor.
+
+    Raises:
+        ValueError: nếu cursor sai định dạng hoặc không có đúng `size` giá trị
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def parse_limit(value, default, maximum):
+    """?limit= không hợp lệ hoặc <= 0 -> `default`, lớn hơn `maximum` -> `maximum`"""
+    try:
+        limit = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+    if limit <= 0:
+        return default
+    return min(limit, maximum)
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import time
+import weakref
+import redis
+import redis.asyncio
+from django.conf import settings
+
+# Sau lỗi kết nối, tạm bỏ qua Redis một lúc (caller dùng đường fallback của mình)
+REDIS_RETRY_AFTER = 5
+
+_state = {'client': None, 'down_until': 0}
+_lock = threading.Lock()
+# Client asyncio gắn với event loop tạo ra nó -> mỗi loop một client
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_redis():
+    """
+    Client Redis dùng chung cho các cấu trúc mà Django cache không hỗ trợ
+    (Lua script, bitmap). Trả về None nếu chưa cấu hình REDIS_URL hoặc Redis vừa lỗi.
+    """
+    url = getattr(settings, 'REDIS_URL', None)
+    if not url or _state['down_until'] > time.monotonic():
+        return None
+    with _lock:
+        if _state['client'] is None:
+            _state['client'] = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _state['client']
+
+
+def get_async_redis():
+    """
+    Như get_redis nhưng cho code async (consumer, ASGI middleware): không phải chuyển sang
+    thread cho mỗi lệnh. Chỉ gọi bên trong event loop đang chạy.
+    """
+    url = getattr(settings, 'REDIS_URL', None)
+    if not url or _state['down_until'] > time.monotonic():
+        return None
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = redis.asyncio.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        _async_clients[loop] = client
+    return client
+
+
+def mark_redis_down():
+    _state['down_until'] = time.monotonic() + REDIS_RETRY_AFTER
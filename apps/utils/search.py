@@ -0,0 +1,35 @@
+from django.db import connections
+from django.db.models import Q
+
+# Ngưỡng mặc định của pg_trgm (pg_trgm.similarity_threshold)
+SIMILARITY_THRESHOLD = 0.3
+
+
+def is_postgres(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def search_queryset(queryset, query, fields):
+    """
+    Lọc `queryset` theo `query` trên các `fields`, kết quả khớp nhất đứng trước.
+
+    Trên PostgreSQL: icontains hoặc trigram_similar, xếp hạng theo TrigramSimilarity lớn
+    nhất giữa các field. Lệnh create_search_indexes tạo GIN gin_trgm_ops trên UPPER(col)
+    (cho icontains) và trên cột gốc (cho trigram_similar) để cả hai vế của OR đều dùng
+    index (BitmapOr). Backend khác (SQLite) chỉ dùng icontains, xếp theo pk.
+    """
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': query})
+
+    if not is_postgres(queryset.db):
+        return queryset.filter(condition).order_by('pk')
+
+    from django.contrib.postgres.search import TrigramSimilarity
+    from django.db.models.functions import Greatest
+
+    for field in fields:
+        condition |= Q(**{f'{field}__trigram_similar': query})
+    similarities = [TrigramSimilarity(field, query) for field in fields]
+    rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+    return queryset.annotate(search_rank=rank).filter(condition).order_by('-search_rank', 'pk')
@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+import redis
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+from .redis_client import get_redis, mark_redis_down
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'throttle:stats'
+
+# KEYS[1] = bucket, KEYS[2] = stats
+# ARGV = capacity, refill (token/giây), now, ttl, scope
+# Trả về {allowed, wait (giây, dạng chuỗi vì Lua number bị cắt thành integer)}
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / refill
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+if allowed == 1 then
+    redis.call('HINCRBY', KEYS[2], ARGV[5] .. ':allowed', 1)
+else
+    redis.call('HINCRBY', KEYS[2], ARGV[5] .. ':rejected', 1)
+end
+return {allowed, tostring(wait)}
+"""
+
+
+class LocalTokenBucket:
+    """Token bucket trong process, dùng khi Redis không khả dụng"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill, now, scope):
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0, now - ts) * refill)
+            if tokens >= 1:
+                allowed, wait = True, 0
+                tokens -= 1
+            else:
+                allowed, wait = False, (1 - tokens) / refill
+            self._buckets[key] = (tokens, now)
+            field = f"{scope}:{'allowed' if allowed else 'rejected'}"
+            self._stats[field] = self._stats.get(field, 0) + 1
+            # Bucket đã đầy lại thì không cần giữ
+            if len(self._buckets) > 10000:
+                self._buckets = {
+                    k: (t, s) for k, (t, s) in self._buckets.items() if t + (now - s) * refill < capacity
+                }
+            return allowed, wait
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+_local_buckets = LocalTokenBucket()
+_scripts = {}
+
+
+def _get_script():
+    client = get_redis()
+    if client is None:
+        return None
+    if client not in _scripts:
+        _scripts[client] = client.register_script(TOKEN_BUCKET_SCRIPT)
+    return _scripts[client]
+
+
+def consume_token(key, capacity, period, scope):
+    """
+    Lấy một token khỏi bucket `key` (đầy `capacity` token, nạp lại hết sau `period` giây).
+
+    Returns:
+        tuple: (allowed, wait) với wait là số giây cần chờ khi bị từ chối
+    """
+    refill = capacity / period
+    now = time.time()
+    script = _get_script()
+    if script is not None:
+        try:
+            allowed, wait = script(keys=[key, STATS_KEY], args=[capacity, refill, now, math.ceil(period), scope])
+            return bool(allowed), float(wait)
+        except redis.RedisError as e:
+            logger.warning(f"Redis throttle unavailable, falling back to local buckets: {e}")
+            mark_redis_down()
+    return _local_buckets.consume(key, capacity, refill, now, scope)
+
+
+def get_throttle_stats():
+    """Số request được cho qua / bị từ chối theo scope (Redis và bucket trong process)"""
+    stats = {'local': _local_buckets.stats(), 'redis': {}}
+    client = get_redis()
+    if client is not None:
+        try:
+            stats['redis'] = {
+                field.decode(): int(value) for field, value in client.hgetall(STATS_KEY).items()
+            }
+        except redis.RedisError as e:
+            logger.warning(f"Cannot read throttle stats from Redis: {e}")
+    return stats
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle theo token bucket, cấu hình theo view:
+
+        throttle_scope = 'login'
+        throttle_classes = [IPTokenBucketThrottle]
+
+    Rate lấy từ DEFAULT_THROTTLE_RATES['<throttle_scope>_<kind>'] (định dạng DRF, vd '10/min'),
+    không có rate thì không giới hạn.
+    """
+    kind = None
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_key_ident(self, request):
+        raise NotImplementedError('.get_key_ident() must be overridden')
+
+    def allow_request(self, request, view):
+        scope = f"{getattr(view, 'throttle_scope', None) or 'default'}_{self.kind}"
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if not rate:
+            return True
+
+        capacity, period = self.parse_rate(rate)
+        key = f'throttle:{scope}:{self.get_key_ident(request)}'
+        allowed, self.wait_seconds = consume_token(key, capacity, period, scope)
+        return allowed
+
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return int(num), duration
+
+    def wait(self):
+        return math.ceil(self.wait_seconds) if self.wait_seconds else None
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'ip'
+
+    def get_key_ident(self, request):
+        return self.get_ident(request)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Theo user đã đăng nhập, request ẩn danh tính theo IP"""
+    kind = 'user'
+
+    def get_key_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return self.get_ident(request)
+
+
+class UsernameTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Theo username gửi lên (endpoint đăng nhập): chặn dò mật khẩu một tài khoản từ nhiều IP.
+    Request không có username thì không giới hạn ở tầng này (IP throttle vẫn áp dụng).
+    """
+    kind = 'username'
+    username_field = 'username'
+
+    def allow_request(self, request, view):
+        if not self.get_username(request):
+            return True
+        return super().allow_request(request, view)
+
+    def get_username(self, request):
+        try:
+            username = request.data.get(self.username_field)
+        except AttributeError:
+            return None
+        return username.strip().lower() if isinstance(username, str) else None
+
+    def get_key_ident(self, request):
+        # Hash để key Redis có độ dài cố định dù client gửi username dài bao nhiêu
+        return hashlib.sha256(self.get_username(request).encode()).hexdigest()[:32]